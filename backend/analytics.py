@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from metrics import STAGE_SECONDS
+
+ROLLUP_FIELDS = ('intent', 'mood', 'tone')
+
+
+def event_day(event):
+    return event['timestamp'][:10]
+
+
+class FirestoreSink:
+    # Each flush becomes new documents instead of a rewrite of one growing one:
+    #   global_behavior_daily/{day}/batches/{auto id}  {'queries': [...]}
+    #   global_behavior_daily/{day}/counters/{shard}   {'intent': {'greeting': n, ...}, ...}
+    # Counter increments go to a random shard so concurrent workers don't
+    # contend on a single document.
+    def __init__(self, db, increment, collection='global_behavior_daily', counter_shards=8):
+        self.db = db
+        self.increment = increment
+        self.collection = collection
+        self.counter_shards = counter_shards
+
+    def write(self, events, rollups):
+        batch = self.db.batch()
+        days = self.db.collection(self.collection)
+        by_day = {}
+        for event in events:
+            by_day.setdefault(event_day(event), []).append(event)
+        for day, day_events in by_day.items():
+            batch.set(days.document(day).collection('batches').document(), {'queries': day_events})
+        for day, counts in rollups.items():
+            shard = days.document(day).collection('counters').document(str(random.randrange(self.counter_shards)))
+            fields = {}
+            for (field, value), count in counts.items():
+                fields.setdefault(field, {})[value] = self.increment(count)
+            batch.set(shard, fields, merge=True)
+        batch.commit()
+
+
+class LogSink:
+    # Append-only JSON lines, one file per day: query events as they are,
+    # rolled-up counters as {"counters": {...}} lines
+    def __init__(self, directory='behavior_logs'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, events, rollups):
+        lines = {}
+        for event in events:
+            lines.setdefault(event_day(event), []).append(json.dumps(event, ensure_ascii=False))
+        for day, counts in rollups.items():
+            counters = {}
+            for (field, value), count in counts.items():
+                counters.setdefault(field, {})[value] = count
+            lines.setdefault(day, []).append(json.dumps({'counters': counters}))
+        for day, day_lines in lines.items():
+            with open(os.path.join(self.directory, f"behavior-{day}.jsonl"), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(day_lines) + '\n')
+
+
+class BehaviorAnalytics:
+    # Bounded in-process buffer of query events flushed in the background
+    # when flush_size events are waiting or every flush_interval seconds.
+    # When the sink is slower than the traffic the buffer fills up and the
+    # oldest events are dropped (and counted) instead of blocking /chat.
+    # Rolled-up intent/mood/tone counts are kept for every event, including
+    # dropped ones, so the counters stay exact.
+    def __init__(self, sink, max_buffer=10000, flush_size=500, flush_interval=5.0, max_backoff=60.0):
+        self.sink = sink
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.buffer = deque(maxlen=max_buffer)
+        self.rollups = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.closed = False
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failures = 0
+        self.flusher = threading.Thread(target=self._flush_loop, name='behavior-flush', daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def record(self, query, intent, mood, tone):
+        event = {
+            'query': query,
+            'intent': intent,
+            'mood': mood,
+            'tone': tone,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        with self.lock:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(event)
+            self.recorded += 1
+            counts = self.rollups.setdefault(event_day(event), Counter())
+            for field in ROLLUP_FIELDS:
+                counts[(field, event[field])] += 1
+            if len(self.buffer) >= self.flush_size:
+                self.wakeup.notify()
+
+    def _take(self):
+        events = [self.buffer.popleft() for _ in range(min(self.flush_size, len(self.buffer)))]
+        rollups, self.rollups = self.rollups, {}
+        return events, rollups
+
+    def _restore(self, events, rollups):
+        # Put a failed flush back in front of newer events, as far as it fits
+        room = self.buffer.maxlen - len(self.buffer)
+        self.dropped += max(0, len(events) - room)
+        self.buffer.extendleft(reversed(events[len(events) - room:] if room < len(events) else events))
+        for day, counts in rollups.items():
+            self.rollups.setdefault(day, Counter()).update(counts)
+
+    def _flush_loop(self):
+        backoff = self.flush_interval
+        with self.lock:
+            while not self.closed:
+                self.wakeup.wait(backoff)
+                if self.closed:
+                    break
+                if self._flush_locked():
+                    backoff = self.flush_interval
+                else:
+                    backoff = min(backoff * 2, self.max_backoff)
+
+    def _flush_locked(self):
+        ok = True
+        while (self.buffer or self.rollups) and ok:
+            events, rollups = self._take()
+            self.lock.release()
+            try:
+                with STAGE_SECONDS.time('analytics_flush'):
+                    self.sink.write(events, rollups)
+            except Exception as e:
+                logging.error(f"Behavior analytics flush failed: {e}")
+                ok = False
+            finally:
+                self.lock.acquire()
+            if ok:
+                self.flushed += len(events)
+            else:
+                self.failures += 1
+                self._restore(events, rollups)
+            if len(self.buffer) < self.flush_size:
+                break
+        return ok
+
+    def flush(self):
+        with self.lock:
+            return self._flush_locked()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'buffered': len(self.buffer),
+                'recorded': self.recorded,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failures': self.failures,
+            }
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.wakeup.notify()
+        self.flusher.join(timeout=5)
+        with self.lock:
+            deadline = time.monotonic() + 10
+            while (self.buffer or self.rollups) and time.monotonic() < deadline:
+                if not self._flush_locked():
+                    break
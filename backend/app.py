@@ -3,18 +3,38 @@ from flask_cors import CORS
 import json
 import nltk
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from transformers import pipeline
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
 from googletrans import Translator
-from data_loader import load_music_data, load_movie_data, load_book_data
+from data_loader import load_catalog
+from recommendation_index import RecommendationIndex, TITLE_KEYS
+from intent_service import IntentEngine, RemoteIntentClassifier, load_intent_classifier, rule_based_intent, apply_intent_rules
+from intent_cache import IntentCache
+from translation_store import TranslationStore
+from translation_service import TranslationService, SUPPORTED_LANGUAGES
+from user_state import UserStateStore
+from analytics import BehaviorAnalytics, FirestoreSink, LogSink
+from resources import Startup
+from similarity import SimilarityEngine
+from keyword_matcher import KeywordRules
+from exclusions import UserExclusions, migrate_user_data, item_id
+from recommendation_cache import RecommendationPoolCache
+from metrics import registry, CONTENT_TYPE, STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, INTENTS
+from chat_logging import configure_logging, chat_log, sample_request
+from profiling import RequestProfiler
+import logging
+import atexit
 import numpy as np
 import random
 from datetime import datetime
+from itertools import zip_longest
 import re
-import pickle
 import os
 
+configure_logging()
+# PROFILE_SAMPLE_RATE=0.01 profiles 1% of requests into PROFILE_DIR
+profiler = RequestProfiler(float(os.environ.get('PROFILE_SAMPLE_RATE', 0)), os.environ.get('PROFILE_DIR', 'profiles'))
+
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -25,59 +45,157 @@ def add_cors_headers(response):
     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
     return response
 
-# Initialize Firebase
-cred = credentials.Certificate('firebase-adminsdk.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-print("Firebase Connected!")
-
-# Initialize NLP tools
-nltk.download('vader_lexicon')
-sia = SentimentIntensityAnalyzer()
-translator = Translator()
-intent_classifier = pipeline('zero-shot-classification', model='facebook/bart-large-mnli')
-
-# Load recommendation data
-music_data = load_music_data('spotify_tracks.csv')
-movie_data = load_movie_data('netflix_movies.csv')
-book_data = load_book_data('books.csv')
-
-# Translation cache
-translation_cache_file = 'translation_cache.pkl'
-if os.path.exists(translation_cache_file):
-    with open(translation_cache_file, 'rb') as f:
-        translation_cache = pickle.load(f)
-else:
-    translation_cache = {}
-
-def save_translation_cache():
-    with open(translation_cache_file, 'wb') as f:
-        pickle.dump(translation_cache, f)
-
-# Knowledge base
-knowledge_base = {
-    "who is the father of RecoBuddy": "KURUVA SANDEEP",
-    "who is the creator of RecoBuddy": "KURUVA SANDEEP",
-    "what is the capital of france": "The capital of France is Paris.",
-    "how to stay productive": "Try using the Pomodoro technique: work for 25 minutes, then take a 5-minute break.",
-    "tell me a joke": "Why did the computer go to school? Because it wanted to improve its *byte*!",
-    "who is elon musk": "Elon Musk is a billionaire entrepreneur, CEO of Tesla, SpaceX, and xAI, known for his work in electric vehicles, space travel, and AI.",
-    "what is python": "Python is a high-level, interpreted programming language known for its readability and versatility, widely used in web development, data science, and AI.",
-    "how does gravity work": "Gravity is a fundamental force that attracts objects towards each other, proportional to their mass and inversely proportional to the distance squared.",
-    "what is the weather like": "I don’t have real-time weather data, but I can explain weather patterns or recommend indoor activities!",
-    "what is ai": "Artificial Intelligence (AI) refers to computer systems that perform tasks requiring human intelligence, like learning or problem-solving.",
-    "how to cook pasta": "Boil water with a pinch of salt, add pasta, cook for 8-12 minutes until al dente, then drain and serve with sauce.",
-    "what is the meaning of life": "The meaning of life varies for everyone! Many find it in pursuing personal purpose or happiness.",
-    "what is machine learning": "Machine learning is a subset of AI where computers learn from data to make predictions without explicit programming.",
-    "what is the largest planet": "Jupiter is the largest planet in our solar system, with a diameter of about 139,820 kilometers.",
-    "hello": "Hey there! How can I assist you today? Maybe a book, movie, or music recommendation? 😊",
-    "how are you": "I'm great! Thanks for asking. Is there anything I can help you with?"
+# Knowledge base, category and recommendation keywords and the profanity
+# list, matched in one pass per message; edits to keywords.json are picked
+# up without a restart
+keyword_rules = KeywordRules()
+
+# Static replies; these are pre-translated into every supported language
+WELCOME_NEW_USER = "Welcome to RecoBuddy! I'm here to recommend books, movies, and music. What would you like a recommendation for? 😊"
+WELCOME_BACK = "Welcome back to RecoBuddy! Ready for some great recommendations? 🤗"
+INVALID_QUERY_RESPONSE = "Sorry, your query seems unclear or contains repetitive text. Please ask for a specific recommendation, like a book, movie, or music!"
+RESPONSES = {
+    'greeting': ["Hey there! What recommendation can I find for you today? 😊"],
+    'question': ["That’s an interesting question! I can help with recommendations—would you like a book, movie, or music suggestion? 😊"],
+    'statement': ["Thanks for sharing! How about a recommendation to explore something new? 🤗"],
+    'feedback': ["Thanks for your feedback! It helps me improve. 😊"],
+    'profanity': ["Let’s keep things friendly! Try asking for a book, movie, or music recommendation. 😊"],
+    'negative_mood': ["I’m sorry you’re feeling down. How about a recommendation to cheer you up? 😊"],
+    'complex_query': ["That sounds like a complex topic! I’m best at recommending books, movies, and music—would you like a suggestion? 😊"],
+    'recommendation': None
 }
+TONE_PREFIXES = {'angry': "I’m sorry if I upset you!", 'polite': "Thank you for your kind words!"}
+NEGATIVE_MOOD_SUFFIX = "How about a fun recommendation? 😊"
+NO_CATEGORY_RESPONSE = "Sorry, I don’t have recommendations for that category yet. Try asking for a book, movie, or music!"
+NO_MORE_RECOMMENDATIONS = "That’s all I have for now. Try another category or emotion!"
+
+def static_replies():
+    replies = [WELCOME_NEW_USER, WELCOME_BACK, INVALID_QUERY_RESPONSE, NEGATIVE_MOOD_SUFFIX,
+               NO_CATEGORY_RESPONSE, NO_MORE_RECOMMENDATIONS]
+    replies += [reply for options in RESPONSES.values() if options for reply in options]
+    replies += list(TONE_PREFIXES.values())
+    replies += list(keyword_rules.current().knowledge_base.values())
+    return replies
+
+# Staged startup: every resource below is created on first use by its loader
+# (see resources.py). startup.warm_up() loads them all in the background when
+# the server starts, so / and the cheap chat paths answer while the intent
+# model and the catalogs are still loading; /readyz reports the stages.
+startup = Startup()
+
+def load_firestore():
+    cred = credentials.Certificate('firebase-adminsdk.json')
+    firebase_admin.initialize_app(cred)
+    client = firestore.client()
+    logging.info("Firebase Connected!")
+    return client
+
+def load_user_state():
+    # Cached user documents with coalesced, field-level writes
+    # Documents in the old shape are migrated to the compact exclusions on read
+    return UserStateStore(
+        firestore_db.get(), auth, firestore.ArrayUnion, migrate=migrate_user_data,
+        ttl=float(os.environ.get('USER_STATE_TTL', 30)),
+        flush_delay=float(os.environ.get('USER_STATE_FLUSH_DELAY', 0.25)),
+        max_size=int(os.environ.get('USER_STATE_CACHE_SIZE', 10000))
+    )
+
+def load_behavior_analytics():
+    # Global behavior analytics, buffered and flushed in the background into
+    # per-day documents (or local JSON lines with ANALYTICS_SINK=log)
+    if os.environ.get('ANALYTICS_SINK') == 'log':
+        sink = LogSink(os.environ.get('ANALYTICS_LOG_DIR', 'behavior_logs'))
+    else:
+        sink = FirestoreSink(firestore_db.get(), firestore.Increment)
+    return BehaviorAnalytics(
+        sink,
+        max_buffer=int(os.environ.get('ANALYTICS_BUFFER', 10000)),
+        flush_interval=float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', 5))
+    )
+
+def load_sentiment():
+    # Only download the VADER lexicon when it isn't installed yet
+    try:
+        nltk.data.find('sentiment/vader_lexicon.zip')
+    except LookupError:
+        nltk.download('vader_lexicon')
+    return SentimentIntensityAnalyzer()
+
+def load_intent_engine():
+    # Intent model: a shared intent service (see intent_service.py) when
+    # INTENT_SERVICE_URL is set, otherwise the in-process INTENT_BACKEND
+    # (bart, bart-int8, distilled or tfidf; INTENT_MODEL overrides its model)
+    if os.environ.get('INTENT_SERVICE_URL'):
+        classifier = RemoteIntentClassifier(os.environ['INTENT_SERVICE_URL'])
+    else:
+        classifier = load_intent_classifier(os.environ.get('INTENT_BACKEND', 'bart'), os.environ.get('INTENT_MODEL'))
+    return IntentEngine(classifier, is_recommendation=is_recommendation_request, labels=intent_cache.get())
+
+def load_intent_cache():
+    # Cache of the intent model's label per normalized message
+    cache = IntentCache(
+        max_size=int(os.environ.get('INTENT_CACHE_SIZE', 10000)),
+        ttl=float(os.environ['INTENT_CACHE_TTL']) if os.environ.get('INTENT_CACHE_TTL') else None,
+        path=os.environ.get('INTENT_CACHE_FILE')
+    )
+    atexit.register(cache.save)
+    return cache
+
+def load_catalogs():
+    # Load recommendation data
+    music_data = load_catalog('music', 'spotify_tracks.csv')
+    movie_data = load_catalog('movie', 'netflix_movies.csv')
+    book_data = load_catalog('book', 'books.csv')
+    catalogs = {'book': book_data, 'movie': movie_data, 'music': music_data}
+    return catalogs, RecommendationIndex(catalogs)
+
+def load_similarity():
+    # Feature matrices for similarity ranking, stored with the catalog snapshots
+    return SimilarityEngine(catalogs.get()[0])
+
+def load_translation_service():
+    # Translation cache (SQLite, shared by all workers); imports the old
+    # pickle cache the first time it runs
+    store = TranslationStore(os.environ.get('TRANSLATION_CACHE_DB', 'translation_cache.db'))
+    if os.path.exists('translation_cache.pkl'):
+        store.migrate_pickle('translation_cache.pkl')
+    service = TranslationService(
+        Translator(), store,
+        max_concurrency=int(os.environ.get('TRANSLATION_CONCURRENCY', 8)),
+        timeout=float(os.environ.get('TRANSLATION_TIMEOUT', 3.0)),
+        pretranslate_concurrency=int(os.environ.get('PRETRANSLATE_CONCURRENCY', 2))
+    )
+    service.pretranslate(static_replies(), SUPPORTED_LANGUAGES)
+    atexit.register(service.close)
+    # Knowledge-base answers added to keywords.json later are pre-translated too
+    keyword_rules.on_reload(lambda _: service.pretranslate(static_replies(), SUPPORTED_LANGUAGES))
+    return service
+
+firestore_db = startup.add('firestore', load_firestore)
+user_state = startup.add('user_state', load_user_state)
+behavior_analytics = startup.add('behavior_analytics', load_behavior_analytics)
+translation_service = startup.add('translation', load_translation_service)
+sentiment_analyzer = startup.add('sentiment', load_sentiment)
+intent_cache = startup.add('intent_cache', load_intent_cache)
+intent_engine = startup.add('intent_model', load_intent_engine)
+catalogs = startup.add('catalogs', load_catalogs)
+similarity = startup.add('similarity', load_similarity)
+
+# Recommendations are drawn from the most similar candidates
+SIMILAR_TOP_K = 10
+# /recommendations pages through a pool of ranked candidates per category,
+# kept server-side for RECOMMENDATION_POOL_TTL seconds
+RECOMMENDATIONS_PER_PAGE = 5
+MAX_RECOMMENDATIONS_PER_PAGE = 50
+RECOMMENDATION_POOL_SIZE = int(os.environ.get('RECOMMENDATION_POOL_SIZE', 100))
+recommendation_pools = RecommendationPoolCache(ttl=float(os.environ.get('RECOMMENDATION_POOL_TTL', 300)))
 
 # Profanity filter
 def contains_profanity(message):
-    pattern = re.compile(r"\b(fuck|shit|damn|bitch|asshole)\b", re.IGNORECASE)
-    return bool(pattern.search(message))
+    return 'profanity' in keyword_rules.scan(message.lower())
+
+def is_recommendation_request(message):
+    return 'recommendation' in keyword_rules.scan(message)
 
 # Detect malformed input
 def is_malformed_input(message):
@@ -91,288 +209,508 @@ def is_malformed_input(message):
             return True
     return False
 
-# Translate with caching
+# Translate with caching; falls back to the original text on errors or timeouts
 def translate_text(text, src='en', dest='en'):
-    cache_key = f"{text}:{src}:{dest}"
-    if cache_key in translation_cache:
-        return translation_cache[cache_key]
-    try:
-        translated = translator.translate(text, src=src, dest=dest).text
-        translation_cache[cache_key] = translated
-        save_translation_cache()
-        print(f"🔹 Translated '{text}' from {src} to {dest}: '{translated}'")
-        return translated
-    except Exception as e:
-        print(f"Translation error: {e}")
-        return text
-
-# Generate emotion-based recommendation
-def generate_recommendation(user_message, user_lang, user_data, requested_rating=None, emotion='neutral'):
-    category = 'book' if 'book' in user_message or 'livre' in user_message or 'पुस्तक' in user_message else \
-               'movie' if 'movie' in user_message or 'film' in user_message or 'फिल्म' in user_message else \
-               'music' if 'music' in user_message or 'song' in user_message or 'संगीत' in user_message else 'book'
-    data = {'book': book_data, 'movie': movie_data, 'music': music_data}.get(category, book_data)
-    
-    if not data:
-        return "Sorry, I don’t have recommendations for that category yet. Try asking for a book, movie, or music!"
-
-    disliked = user_data.get('preferences', {}).get('disliked', [])
-    previously_recommended = user_data.get('previously_recommended', {}).get(category, [])
-    # Use 'book_title' for books, 'title' for movies, and 'name' for music
-    key = 'book_title' if category == 'book' else 'title' if category == 'movie' else 'name'
+    return translation_service.get().translate(text, src=src, dest=dest)
+
+def recommendation_candidates(category, emotion, exclusions, requested_rating=None):
+    # Items of a category the user hasn't disliked or seen recently, with the
+    # rating filter applied. Returns (candidates, None), or (None, reply) when
+    # there is nothing to recommend.
+    recommendation_index = catalogs.get()[1]
+    seen = exclusions.seen_window(category)
+    disliked_ids = list(exclusions.disliked)
     # Filter available recommendations
-    available = [rec for rec in data if rec[key] not in disliked and 
-                 rec[key] not in previously_recommended and 
-                 rec['emotion'] == emotion]
+    available = recommendation_index.candidates(category, emotion, excluded_ids=disliked_ids + list(seen))
     
     # Apply rating filter if specified
     if requested_rating is not None:
         # First try exact match (rating >= requested_rating)
-        exact_matches = [rec for rec in available if float(rec.get('rating', 0)) >= requested_rating]
+        exact_matches = available.with_min_rating(requested_rating)
         if exact_matches:
             available = exact_matches
         else:
             # Fallback: allow ratings within 0.5 of the requested rating
             threshold = max(0, requested_rating - 0.5)
-            available = [rec for rec in available if float(rec.get('rating', 0)) >= threshold]
+            available = available.with_min_rating(threshold)
             if not available:
-                return f"No {emotion} {category}s found with a rating of {requested_rating} or higher. Try a lower rating or a different category!"
+                return None, f"No {emotion} {category}s found with a rating of {requested_rating} or higher. Try a lower rating or a different category!"
     
     # Additional validation for books: ensure book_title is not 'nan'
     if category == 'book':
-        available = [rec for rec in available if rec['book_title'] and rec['book_title'].lower() != 'nan']
+        available = available.with_valid_titles()
     
-    if not available:
-        # Clear previously recommended if no matches found
-        user_data.setdefault('previously_recommended', {}).setdefault(category, []).clear()
-        available = [rec for rec in data if rec[key] not in disliked and 
-                     rec['emotion'] == emotion]
+    while not available and len(seen):
+        # Everything left was recommended already: forget the older half of
+        # the seen window, so repeats come back gradually
+        seen.truncate(len(seen) // 2)
+        available = recommendation_index.candidates(category, emotion, excluded_ids=disliked_ids + list(seen))
         if category == 'book':
-            available = [rec for rec in available if rec['book_title'] and rec['book_title'].lower() != 'nan']
+            available = available.with_valid_titles()
     
     if not available:
-        return f"I’ve run out of {emotion} {category} recommendations. Try another category or emotion!"
-
-    random.shuffle(available)
-    rec = available[0]
-    user_data.setdefault('previously_recommended', {}).setdefault(category, []).append(rec[key])
-    
+        return None, f"I’ve run out of {emotion} {category} recommendations. Try another category or emotion!"
+    return available, None
+
+def liked_catalog_rows(category, user_data):
+    # Catalog rows of what the user liked in this category; empty until the
+    # similarity features are loaded. The first request that needs them
+    # starts the load when warm_up() hasn't (e.g. under a WSGI server).
+    if not similarity.ready:
+        if user_data.get('preferences', {}).get('liked'):
+            similarity.start()
+        return []
+    return similarity.value.liked_rows(category, user_data.get('preferences', {}).get('liked', []))
+
+def similar_rows(category, available, liked_rows, emotion, k):
+    # The k candidates most similar to the liked items, best first
+    query = similarity.value.query(category, liked_rows, emotion)
+    return similarity.value.top_k(category, query, k, rows=available.rows())
+
+def format_recommendation(category, rec):
     if category == 'book':
-        response = f"I recommend '{rec['book_title']}' by {rec['book_author']} ({rec['year_of_publication']}, Rating: {rec['rating']}).\n" \
-                   f"Category: {rec['Category']}\nSummary: {rec['Summary']}\nEmotion: {rec['emotion'].capitalize()}"
+        return f"I recommend '{rec['book_title']}' by {rec['book_author']} ({rec['year_of_publication']}, Rating: {rec['rating']}).\n" \
+               f"Category: {rec['Category']}\nSummary: {rec['Summary']}\nEmotion: {rec['emotion'].capitalize()}"
     elif category == 'movie':
-        response = f"I recommend '{rec['title']}' directed by {rec['director']} ({rec['release_year']}, Rating: {rec['rating']}).\n" \
-                   f"Genres: {rec['listed_in']}\nDescription: {rec['description']}\nEmotion: {rec['emotion'].capitalize()}"
-    else:
-        response = f"I recommend '{rec['name']}' by {rec['artists']} ({rec['year']}, Valence: {rec['emotion']}).\n" \
-                   f"Emotion: {rec['emotion'].capitalize()}"
+        return f"I recommend '{rec['title']}' directed by {rec['director']} ({rec['release_year']}, Rating: {rec['rating']}).\n" \
+               f"Genres: {rec['listed_in']}\nDescription: {rec['description']}\nEmotion: {rec['emotion'].capitalize()}"
+    return f"I recommend '{rec['name']}' by {rec['artists']} ({rec['year']}, Valence: {rec['emotion']}).\n" \
+           f"Emotion: {rec['emotion'].capitalize()}"
+
+# Generate emotion-based recommendation
+def generate_recommendation(user_message, user_lang, user_data, requested_rating=None, emotion='neutral'):
+    category = keyword_rules.scan(user_message).first('category', 'book')
+    catalog_data = catalogs.get()[0]
+    data = catalog_data.get(category, catalog_data['book'])
     
-    return response
+    if not data:
+        return NO_CATEGORY_RESPONSE
+
+    exclusions = UserExclusions(user_data)
+    available, reply = recommendation_candidates(category, emotion, exclusions, requested_rating)
+    if available is None:
+        return reply
+
+    # Rank the candidates by similarity to what the user liked in this
+    # category; without likes (or until the features are loaded) pick uniformly
+    liked_rows = liked_catalog_rows(category, user_data)
+    if liked_rows:
+        rec = data[int(random.choice(similar_rows(category, available, liked_rows, emotion, SIMILAR_TOP_K)))]
+    else:
+        rec = available.sample()
+    # Use 'book_title' for books, 'title' for movies, and 'name' for music
+    exclusions.mark_seen(category, rec[TITLE_KEYS[category]])
+    exclusions.save()
+    return format_recommendation(category, rec)
+
+def generate_recommendations(user_data, categories, count, requested_rating=None, emotion='neutral', pool=None):
+    # Up to `count` distinct items across `categories` in one call. Each
+    # category's candidates are ranked once (most similar to the liked items
+    # first, otherwise in random order) into a pool of
+    # RECOMMENDATION_POOL_SIZE rows per category, interleaved across
+    # categories. The first `count` items are marked seen in one save; the
+    # rest of the pool is returned so the next page continues from it
+    # (pass it back as `pool`). Returns (items, rest of pool, replies
+    # explaining categories without candidates).
+    catalog_data = catalogs.get()[0]
+    exclusions = UserExclusions(user_data)
+    replies = []
+    if pool is None:
+        ranked = []
+        for category in categories:
+            if not catalog_data.get(category):
+                replies.append(NO_CATEGORY_RESPONSE)
+                continue
+            available, reply = recommendation_candidates(category, emotion, exclusions, requested_rating)
+            if available is None:
+                replies.append(reply)
+                continue
+            liked_rows = liked_catalog_rows(category, user_data)
+            if liked_rows:
+                rows = similar_rows(category, available, liked_rows, emotion, RECOMMENDATION_POOL_SIZE)
+            else:
+                rows = available.sample_rows(RECOMMENDATION_POOL_SIZE)
+            ranked.append([(category, int(row)) for row in rows])
+        pool = [entry for group in zip_longest(*ranked) for entry in group if entry is not None]
+
+    items = []
+    shown = set()
+    used = 0
+    for category, row in pool:
+        if len(items) == count:
+            break
+        used += 1
+        rec = catalog_data[category][row]
+        title = rec[TITLE_KEYS[category]]
+        # Skip repeated titles and items disliked since the pool was built.
+        # Seen items are not skipped, so a retried page returns the same items.
+        if (category, title) in shown or item_id(title) in exclusions.disliked:
+            continue
+        shown.add((category, title))
+        exclusions.mark_seen(category, title)
+        items.append({'category': category, 'title': title, 'text': format_recommendation(category, rec)})
+    exclusions.save()
+    return items, pool[used:], replies
+
+# Chat pipeline steps, shared by the Flask views below and the ASGI app in asgi.py
+
+def parse_chat_request(data):
+    user_message = data.get('message', '').lower()
+    user_lang = data.get('language', 'en')
+    user_id = data.get('user_id', 'anonymous')
+    return user_message, user_lang, user_id
+
+def welcome_message(user_data):
+    # Check if user is new
+    is_new_user = len(user_data['chat_history']) == 0
+    return WELCOME_NEW_USER if is_new_user else WELCOME_BACK
+
+# Validate input
+def is_invalid_message(user_message):
+    return len(user_message.split()) > 50 or not any(c.isalnum() for c in user_message) or is_malformed_input(user_message)
+
+def add_to_history(user_data, user_message, response, mood, tone, topic, intent):
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    user_data['chat_history'].append({
+        'user': user_message,
+        'bot': response,
+        'mood': mood,
+        'tone': tone,
+        'timestamp': timestamp,
+        'topic': topic,
+        'intent': intent
+    })
+    user_data['chat_history'] = user_data['chat_history'][-20:]
+
+def knowledge_answer(user_message):
+    return keyword_rules.scan(user_message).first('knowledge_base')
+
+def provisional_intent(user_message):
+    # Intent that can be decided without the model, or None
+    intent = rule_based_intent(user_message, is_recommendation_request)
+    if intent is None and knowledge_answer(user_message) is not None:
+        intent = apply_intent_rules(user_message, 'question', is_recommendation_request)
+    return intent
+
+def analyze_without_model(user_message):
+    # Sentiment and tone of the raw message, plus the intent when it doesn't
+    # need the model (None otherwise). While the model is still loading a
+    # cached label is used, with the keyword rules applied as IntentEngine
+    # does; otherwise recommendation requests and knowledge-base questions
+    # are answered by the rules and everything else gets 'general' (none of
+    # these are cached). Once loaded, IntentEngine checks the cache itself.
+    with STAGE_SECONDS.time('vader'):
+        sentiment = sentiment_analyzer.get().polarity_scores(user_message)
+    mood = 'positive' if sentiment['compound'] > 0.1 else 'negative' if sentiment['compound'] < -0.1 else 'neutral'
+    tone = 'angry' if sentiment['neg'] > 0.3 else 'polite' if sentiment['pos'] > 0.3 else 'casual'
+
+    intent = None
+    if not intent_engine.ready:
+        intent_engine.start()
+        label = intent_cache.get().get(user_message)
+        if label:
+            intent = apply_intent_rules(user_message, label, is_recommendation_request)
+        else:
+            intent = provisional_intent(user_message) or 'general'
+    return intent, mood, tone
+
+def analyze_message(user_message):
+    intent, mood, tone = analyze_without_model(user_message)
+    if intent is None:
+        # Intent recognition: keyword rules first, zero-shot classification otherwise
+        with STAGE_SECONDS.time('intent'):
+            intent = intent_engine.get().detect(user_message)
+    return intent, mood, tone
+
+def compose_reply(user_message, user_lang, user_data, intent, mood, tone):
+    # Returns the English reply as parts; the parts are translated separately
+    # so the static ones are pre-translated lookups
+    has_profanity = contains_profanity(user_message)
+
+    # Check knowledge base
+    response = None
+    if intent in ['greeting', 'question']:
+        with STAGE_SECONDS.time('kb_match'):
+            response = knowledge_answer(user_message)
+
+    # Generate response
+    if has_profanity:
+        response = random.choice(RESPONSES['profanity'])
+    elif response is None:
+        if intent == 'recommendation':
+            rating_match = re.search(r'(\d+\.?\d*)\s*rating', user_message)
+            requested_rating = float(rating_match.group(1)) if rating_match else None
+            emotion = 'happy' if mood == 'positive' else 'sad' if mood == 'negative' else 'neutral'
+            with STAGE_SECONDS.time('recommendation'):
+                response = generate_recommendation(user_message, user_lang, user_data, requested_rating, emotion)
+        elif intent == 'complex_query':
+            response = random.choice(RESPONSES['complex_query'])
+        elif mood == 'negative':
+            response = random.choice(RESPONSES['negative_mood'])
+        else:
+            response = random.choice(RESPONSES.get(intent, RESPONSES['statement']))
 
-# Store global behavior data
-global_behavior_data = db.collection('global_behavior').document('shared_data').get().to_dict() or {'queries': []}
+    # Adjust response
+    prefix = suffix = None
+    if tone in TONE_PREFIXES:
+        prefix = TONE_PREFIXES[tone]
+    elif mood == 'negative' and intent != 'negative_mood':
+        suffix = NEGATIVE_MOOD_SUFFIX
+    return [part for part in (prefix, response, suffix) if part]
 
-@app.route('/')
-def home():
-    return "Welcome to RecoBuddy!"
+def message_topic(original_message):
+    return original_message[:50] + '...' if len(original_message) > 50 else original_message
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    try:
-        data = request.get_json(silent=True)
-        if not data:
-            return jsonify({"error": "Invalid JSON format", "is_translating": False}), 400
+def handle_chat(data):
+    # Returns (payload, status) for a /chat request body
+    if not data:
+        return {"error": "Invalid JSON format", "is_translating": False}, 400
 
-        user_message = data.get('message', '').lower()
-        user_lang = data.get('language', 'en')
-        user_id = data.get('user_id', 'anonymous')
+    user_message, user_lang, user_id = parse_chat_request(data)
+    chat_log.info("Received user input: %s", user_message)
 
-        print("🔹 Received User Input:", user_message)
+    # Load user data (cached per session; the email is only looked up for new users)
+    user_data = user_state.get().load(user_id)
 
-        # Get user email
-        try:
-            user_email = auth.get_user(user_id).email if user_id != 'anonymous' else 'anonymous'
-        except Exception as e:
-            print(f"Error fetching user email: {e}")
-            user_email = 'anonymous'
-
-        # Load user data
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
-        user_data = user_doc.to_dict() or {
-            'email': user_email,
-            'chat_history': [],
-            'preferences': {'liked': [], 'disliked': [], 'categories': []},
-            'previously_recommended': {'book': [], 'movie': [], 'music': []}
-        }
-
-        # Check if user is new
-        is_new_user = len(user_data['chat_history']) == 0
-
-        # Handle empty message
-        if not user_message.strip():
-            welcome_message = "Welcome to RecoBuddy! I'm here to recommend books, movies, and music. What would you like a recommendation for? 😊" if is_new_user else "Welcome back to RecoBuddy! Ready for some great recommendations? 🤗"
-            return jsonify({'response': welcome_message, 'chat_history': user_data['chat_history'], 'is_translating': False})
-
-        # Validate input
-        if len(user_message.split()) > 50 or not any(c.isalnum() for c in user_message) or is_malformed_input(user_message):
-            response = "Sorry, your query seems unclear or contains repetitive text. Please ask for a specific recommendation, like a book, movie, or music!"
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            user_data['chat_history'].append({
-                'user': user_message,
-                'bot': response,
-                'mood': 'neutral',
-                'tone': 'casual',
-                'timestamp': timestamp,
-                'topic': 'Invalid query',
-                'intent': 'statement'
-            })
-            user_data['chat_history'] = user_data['chat_history'][-20:]
-            user_ref.set(user_data)
-            if user_lang != 'en':
+    # Handle empty message
+    if not user_message.strip():
+        welcome = welcome_message(user_data)
+        if user_lang != 'en':
+            with STAGE_SECONDS.time('translate_out'):
+                welcome = translate_text(welcome, src='en', dest=user_lang)
+        return {'response': welcome, 'chat_history': user_data['chat_history'], 'is_translating': False}, 200
+
+    if is_invalid_message(user_message):
+        response = INVALID_QUERY_RESPONSE
+        add_to_history(user_data, user_message, response, 'neutral', 'casual', 'Invalid query', 'statement')
+        user_state.get().save(user_id, user_data)
+        if user_lang != 'en':
+            with STAGE_SECONDS.time('translate_out'):
                 response = translate_text(response, src='en', dest=user_lang)
-            return jsonify({'response': response, 'chat_history': user_data['chat_history'], 'is_translating': False})
+        return {'response': response, 'chat_history': user_data['chat_history'], 'is_translating': False}, 200
 
-        # Translate to English
-        original_message = user_message
-        is_translating = user_lang != 'en'
-        if is_translating:
+    # Translate to English
+    original_message = user_message
+    is_translating = user_lang != 'en'
+    if is_translating:
+        with STAGE_SECONDS.time('translate_in'):
             user_message = translate_text(user_message, src=user_lang, dest='en').lower()
 
-        # Sentiment and tone analysis
-        sentiment = sia.polarity_scores(user_message)
-        mood = 'positive' if sentiment['compound'] > 0.1 else 'negative' if sentiment['compound'] < -0.1 else 'neutral'
-        tone = 'angry' if sentiment['neg'] > 0.3 else 'polite' if sentiment['pos'] > 0.3 else 'casual'
-        has_profanity = contains_profanity(user_message)
-
-        # Intent recognition with zero-shot classification
-        candidate_labels = ['greeting', 'feedback', 'question', 'statement', 'complex_query', 'recommendation']
-        intent_result = intent_classifier(user_message, candidate_labels, multi_label=False)
-        intent = intent_result['labels'][0]
-        
-        # Override intent for recommendation requests
-        recommendation_keywords = ['recommend', 'recommander', 'recommend a', 'suggest', 'अनुशंसा', 'सुझाव']
-        if any(keyword in user_message for keyword in recommendation_keywords):
-            intent = 'recommendation'
-
-        # Override intent for complex queries
-        if intent not in ['greeting', 'recommendation'] and len(user_message.split()) > 5:
-            intent = 'complex_query'
-
-        # Add to global behavior data
-        global_behavior_data['queries'].append({
-            'query': user_message,
-            'intent': intent,
-            'mood': mood,
-            'tone': tone,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
-        db.collection('global_behavior').document('shared_data').set(global_behavior_data)
-
-        # Check knowledge base
-        response = None
-        if intent in ['greeting', 'question']:
-            for query, answer in knowledge_base.items():
-                if query in user_message:
-                    response = answer
-                    break
-
-        # Generate response
-        responses = {
-            'greeting': ["Hey there! What recommendation can I find for you today? 😊"],
-            'question': ["That’s an interesting question! I can help with recommendations—would you like a book, movie, or music suggestion? 😊"],
-            'statement': ["Thanks for sharing! How about a recommendation to explore something new? 🤗"],
-            'feedback': ["Thanks for your feedback! It helps me improve. 😊"],
-            'profanity': ["Let’s keep things friendly! Try asking for a book, movie, or music recommendation. 😊"],
-            'negative_mood': ["I’m sorry you’re feeling down. How about a recommendation to cheer you up? 😊"],
-            'complex_query': ["That sounds like a complex topic! I’m best at recommending books, movies, and music—would you like a suggestion? 😊"],
-            'recommendation': None
-        }
-
-        if has_profanity:
-            response = random.choice(responses['profanity'])
-        elif response is None:
-            if intent == 'recommendation':
-                rating_match = re.search(r'(\d+\.?\d*)\s*rating', user_message)
-                requested_rating = float(rating_match.group(1)) if rating_match else None
-                emotion = 'happy' if mood == 'positive' else 'sad' if mood == 'negative' else 'neutral'
-                response = generate_recommendation(user_message, user_lang, user_data, requested_rating, emotion)
-            elif intent == 'complex_query':
-                response = random.choice(responses['complex_query'])
-            elif mood == 'negative':
-                response = random.choice(responses['negative_mood'])
+    intent, mood, tone = analyze_message(user_message)
+    INTENTS.inc(intent)
+
+    # Add to global behavior data
+    behavior_analytics.get().record(user_message, intent, mood, tone)
+
+    parts = compose_reply(user_message, user_lang, user_data, intent, mood, tone)
+
+    # Translate response
+    if user_lang != 'en':
+        with STAGE_SECONDS.time('translate_out'):
+            parts = [translate_text(part, src='en', dest=user_lang) for part in parts]
+    response = ' '.join(parts)
+
+    # Update user data
+    add_to_history(user_data, original_message, response, mood, tone, message_topic(original_message), intent)
+    user_state.get().save(user_id, user_data)
+
+    chat_log.info("Buddy's response: %s", response)
+    return {'response': response, 'chat_history': user_data['chat_history'], 'is_translating': is_translating}, 200
+
+def parse_feedback_request(data):
+    # Returns (user_id, title, rating) or an error payload
+    user_id = data.get('user_id', 'anonymous')
+    recommendation = data.get('recommendation')
+    rating = data.get('rating')
+
+    title_match = re.search(r"'([^']+)'", recommendation)
+    if not title_match:
+        return None, {"error": "Invalid recommendation format"}
+    return (user_id, title_match.group(1), rating), None
+
+def apply_feedback(user_data, recommendation_title, rating):
+    if rating == 'like':
+        user_data['preferences'].setdefault('liked', []).append(recommendation_title)
+    elif rating == 'dislike':
+        exclusions = UserExclusions(user_data)
+        exclusions.dislike(recommendation_title)
+        exclusions.save()
+
+def handle_feedback(data):
+    if not data:
+        return {"error": "Invalid JSON format"}, 400
+    parsed, error = parse_feedback_request(data)
+    if error:
+        return error, 400
+    user_id, recommendation_title, rating = parsed
+
+    user_data = user_state.get().load(user_id)
+    apply_feedback(user_data, recommendation_title, rating)
+    user_state.get().save(user_id, user_data)
+    return {"status": "Feedback recorded"}, 200
+
+def parse_recommendations_request(data):
+    # Returns the request parameters or an error payload. Without a cursor a
+    # new pool is built for `categories` (a list or one name; all by default);
+    # with one, the next page of that cursor's pool is returned.
+    for field in ('user_id', 'language', 'cursor'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return None, {"error": f"{field} must be a string"}
+    categories = data.get('categories') or data.get('category') or list(TITLE_KEYS)
+    if isinstance(categories, str):
+        categories = [categories]
+    if not isinstance(categories, list) or not all(isinstance(category, str) for category in categories):
+        return None, {"error": "categories must be a category name or a list of them"}
+    categories = list(dict.fromkeys(category.lower() for category in categories))
+    unknown = [category for category in categories if category not in TITLE_KEYS]
+    if unknown:
+        return None, {"error": f"Unknown categories: {', '.join(unknown)}"}
+    emotion = data.get('emotion', 'neutral')
+    if emotion not in ('happy', 'sad', 'neutral'):
+        return None, {"error": "emotion must be happy, sad or neutral"}
+    count = data.get('count', RECOMMENDATIONS_PER_PAGE)
+    if not isinstance(count, int) or isinstance(count, bool):
+        return None, {"error": "count must be an integer"}
+    rating = data.get('rating')
+    if rating is not None and (not isinstance(rating, (int, float)) or isinstance(rating, bool)):
+        return None, {"error": "rating must be a number"}
+    return {
+        'user_id': data.get('user_id') or 'anonymous',
+        'language': data.get('language') or 'en',
+        'cursor': data.get('cursor'),
+        'count': min(max(count, 1), MAX_RECOMMENDATIONS_PER_PAGE),
+        'categories': categories,
+        'emotion': emotion,
+        'rating': float(rating) if rating is not None else None,
+    }, None
+
+def handle_recommendations(data):
+    # Returns (payload, status) for a /recommendations request body. Skips
+    # the message analysis of /chat: one user read, one ranking per category
+    # (or none when paging), one save.
+    if not data:
+        return {"error": "Invalid JSON format"}, 400
+    if not isinstance(data, dict):
+        return {"error": "Request body must be a JSON object"}, 400
+    params, error = parse_recommendations_request(data)
+    if error:
+        return error, 400
+    user_id, user_lang = params['user_id'], params['language']
+
+    pool = None
+    if params['cursor']:
+        cached = recommendation_pools.get(params['cursor'], user_id)
+        if cached is None:
+            return {"error": "Cursor expired or unknown"}, 410
+        pool, context = cached
+        # The pool was built for the parameters of the first page
+        params.update(context)
+    context = {key: params[key] for key in ('categories', 'emotion', 'rating')}
+
+    user_data = user_state.get().load(user_id)
+    with STAGE_SECONDS.time('recommendation_batch'):
+        items, rest, replies = generate_recommendations(user_data, params['categories'], params['count'],
+                                                        params['rating'], params['emotion'], pool)
+    user_state.get().save(user_id, user_data)
+    next_cursor = recommendation_pools.put(user_id, rest, context) if rest else None
+
+    payload = {'recommendations': items, 'next_cursor': next_cursor}
+    if not items:
+        payload['message'] = replies[0] if replies else NO_MORE_RECOMMENDATIONS
+    if user_lang != 'en':
+        with STAGE_SECONDS.time('translate_out'):
+            if items:
+                texts = translation_service.get().translate_many([item['text'] for item in items], src='en', dest=user_lang)
+                for item, text in zip(items, texts):
+                    item['text'] = text
             else:
-                response = random.choice(responses.get(intent, responses['statement']))
+                payload['message'] = translate_text(payload['message'], src='en', dest=user_lang)
+    return payload, 200
 
-        # Adjust response
-        if tone == 'angry':
-            response = f"I’m sorry if I upset you! {response}"
-        elif tone == 'polite':
-            response = f"Thank you for your kind words! {response}"
-        elif mood == 'negative' and intent != 'negative_mood':
-            response = f"{response} How about a fun recommendation? 😊"
+@app.route('/')
+def home():
+    return "Welcome to RecoBuddy!"
 
-        # Translate response
-        if user_lang != 'en':
-            response = translate_text(response, src='en', dest=user_lang)
-
-        # Update user data
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        topic = original_message[:50] + '...' if len(original_message) > 50 else original_message
-        user_data['chat_history'].append({
-            'user': original_message,
-            'bot': response,
-            'mood': mood,
-            'tone': tone,
-            'timestamp': timestamp,
-            'topic': topic,
-            'intent': intent
-        })
-        user_data['chat_history'] = user_data['chat_history'][-20:]
-        user_ref.set(user_data)
-
-        print("🔹 Buddy's Response:", response)
-        return jsonify({'response': response, 'chat_history': user_data['chat_history'], 'is_translating': is_translating})
-
-    except Exception as e:
-        print("🔹 Server Error:", str(e))
-        return jsonify({"error": "Internal Server Error", "details": str(e), 'is_translating': False}), 500
+@app.route('/stats')
+def stats():
+    return jsonify({'intent_cache': intent_cache.get().stats(), 'behavior_analytics': behavior_analytics.get().stats()})
+
+@app.route('/readyz')
+def readyz():
+    status = startup.status()
+    return jsonify(status), 200 if status['status'] == 'ready' else 503
+
+@registry.collector
+def collect_cache_stats():
+    # Hit rates of the caches that are loaded; scraping never loads a resource
+    caches = {}
+    if intent_cache.ready:
+        caches['intent'] = intent_cache.value.stats()
+    if user_state.ready:
+        caches['user_state'] = user_state.value.stats()
+    if translation_service.ready:
+        caches['translation'] = translation_service.value.store.stats()
+    caches['recommendation_pool'] = recommendation_pools.stats()
+    info = keyword_rules.current().scan.cache_info()
+    caches['keywords'] = {'hits': info.hits, 'misses': info.misses}
+    families = [
+        ('recobuddy_cache_hits_total', 'counter', 'Cache hits.', 'hits'),
+        ('recobuddy_cache_misses_total', 'counter', 'Cache misses.', 'misses'),
+    ]
+    samples = [(name, kind, doc, [({'cache': cache}, values[field]) for cache, values in caches.items()])
+               for name, kind, doc, field in families]
+    samples.append(('recobuddy_cache_hit_ratio', 'gauge', 'Cache hit ratio since start.',
+                    [({'cache': cache}, values['hits'] / max(1, values['hits'] + values['misses'])) for cache, values in caches.items()]))
+    if translation_service.ready:
+        service = translation_service.value
+        samples.append(('recobuddy_translation_coalesced_total', 'counter', 'Translations served by an identical request in flight.', [({}, service.coalesced)]))
+        samples.append(('recobuddy_translation_timeouts_total', 'counter', 'Translations that timed out.', [({}, service.timeouts)]))
+    if intent_engine.ready:
+        engine = intent_engine.value
+        samples.append(('recobuddy_intent_model_calls_total', 'counter', 'Messages sent to the intent model.', [({}, engine.model_calls)]))
+        samples.append(('recobuddy_intent_short_circuits_total', 'counter', 'Intents decided by keyword rules.', [({}, engine.short_circuits)]))
+    if behavior_analytics.ready:
+        analytics = behavior_analytics.value.stats()
+        samples.append(('recobuddy_analytics_events_total', 'counter', 'Behavior events by outcome.',
+                        [({'outcome': outcome}, analytics[outcome]) for outcome in ('recorded', 'flushed', 'dropped')]))
+    samples.append(('recobuddy_resource_ready', 'gauge', 'Whether a startup resource is loaded.',
+                    [({'resource': name}, int(resource.ready)) for name, resource in startup.resources.items()]))
+    return samples
+
+@app.route('/metrics')
+def metrics():
+    return registry.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+def instrumented(endpoint, handler, data):
+    # Request timing and status counts, plus the sampled cProfile mode
+    sample_request()
+    with profiler.profile(endpoint), REQUEST_SECONDS.time(endpoint):
+        try:
+            payload, status = handler(data)
+        except Exception as e:
+            chat_log.exception("%s error: %s", endpoint, e)
+            payload = {"error": "Internal Server Error", "details": str(e)}
+            if endpoint == 'chat':
+                payload['is_translating'] = False
+            status = 500
+    REQUESTS.inc(endpoint, str(status))
+    return payload, status
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    payload, status = instrumented('chat', handle_chat, request.get_json(silent=True))
+    return jsonify(payload), status
 
 @app.route('/feedback', methods=['POST'])
 def feedback():
-    try:
-        data = request.get_json(silent=True)
-        if not data:
-            return jsonify({"error": "Invalid JSON format"}), 400
-
-        user_id = data.get('user_id', 'anonymous')
-        recommendation = data.get('recommendation')
-        rating = data.get('rating')
-
-        title_match = re.search(r"'([^']+)'", recommendation)
-        if not title_match:
-            return jsonify({"error": "Invalid recommendation format"}), 400
-        recommendation_title = title_match.group(1)
-
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
-        user_data = user_doc.to_dict() or {
-            'email': 'anonymous',
-            'chat_history': [],
-            'preferences': {'liked': [], 'disliked': [], 'categories': []},
-            'previously_recommended': {'book': [], 'movie': [], 'music': []}
-        }
-
-        if rating == 'like':
-            user_data['preferences'].setdefault('liked', []).append(recommendation_title)
-        elif rating == 'dislike':
-            user_data['preferences'].setdefault('disliked', []).append(recommendation_title)
-
-        user_ref.set(user_data)
-        return jsonify({"status": "Feedback recorded"})
-    except Exception as e:
-        print("🔹 Feedback Error:", str(e))
-        return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
+    payload, status = instrumented('feedback', handle_feedback, request.get_json(silent=True))
+    return jsonify(payload), status
+
+@app.route('/recommendations', methods=['POST'])
+def recommendations():
+    payload, status = instrumented('recommendations', handle_recommendations, request.get_json(silent=True))
+    return jsonify(payload), status
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    startup.warm_up()
+    app.run(debug=True, host='0.0.0.0', port=5000)
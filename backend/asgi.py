@@ -0,0 +1,242 @@
+# ASGI serving mode for the chat backend:
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+# Same routes and JSON contract as app.py. Firestore reads and writes run on
+# an I/O thread pool and translations are awaited, while sentiment (and
+# the tfidf or remote intent classifiers) run on a small bounded pool so the
+# event loop keeps accepting requests. The batching intent model is awaited
+# on the loop, so every concurrent request can join its next batch. Resources are loaded lazily (see app.startup), so a
+# resource still loading is awaited on the I/O pool, never on the loop.
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+import app as chat_app
+from chat_logging import chat_log, sample_request
+from metrics import registry, CONTENT_TYPE, STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, INTENTS
+
+io_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_IO_WORKERS', 32)), thread_name_prefix='io')
+model_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_MODEL_WORKERS', 2)), thread_name_prefix='model')
+# cProfile of the request being handled, when PROFILE_SAMPLE_RATE sampled it
+current_profile = contextvars.ContextVar('current_profile', default=None)
+
+
+def profiled(fn):
+    # The sampled request's profiler records fn on the worker thread; the
+    # event loop itself is shared by all requests, so it isn't profiled
+    profiler = current_profile.get()
+    if profiler is None:
+        return fn
+
+    def run(*args):
+        profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            profiler.disable()
+    return run
+
+
+async def run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, profiled(fn), *args)
+
+
+async def run_model(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(model_executor, profiled(fn), *args)
+
+
+async def resource(res):
+    if res.ready:
+        return res.value
+    return await run_io(res.get)
+
+
+async def translate(text, src, dest):
+    service = await resource(chat_app.translation_service)
+    return await service.translate_async(text, src=src, dest=dest)
+
+
+async def read_json(request):
+    # Same as Flask's get_json(silent=True)
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+async def analyze_message(user_message):
+    # chat_app.analyze_message, with the intent model awaited on the loop:
+    # a pool thread blocked on each message would cap the model's batches at
+    # the pool size
+    intent, mood, tone = await run_model(chat_app.analyze_without_model, user_message)
+    if intent is None:
+        with STAGE_SECONDS.time('intent'):
+            intent, _ = await chat_app.intent_engine.value.detect_result_async(user_message, run_model)
+    return intent, mood, tone
+
+
+async def handle_chat(data):
+    if not data:
+        return {"error": "Invalid JSON format", "is_translating": False}, 400
+
+    user_message, user_lang, user_id = chat_app.parse_chat_request(data)
+    chat_log.info("Received user input: %s", user_message)
+
+    user_state = await resource(chat_app.user_state)
+    user_data = await run_io(user_state.load, user_id)
+
+    if not user_message.strip():
+        welcome = chat_app.welcome_message(user_data)
+        if user_lang != 'en':
+            with STAGE_SECONDS.time('translate_out'):
+                welcome = await translate(welcome, 'en', user_lang)
+        return {'response': welcome, 'chat_history': user_data['chat_history'], 'is_translating': False}, 200
+
+    if chat_app.is_invalid_message(user_message):
+        response = chat_app.INVALID_QUERY_RESPONSE
+        chat_app.add_to_history(user_data, user_message, response, 'neutral', 'casual', 'Invalid query', 'statement')
+        user_state.save(user_id, user_data)
+        if user_lang != 'en':
+            with STAGE_SECONDS.time('translate_out'):
+                response = await translate(response, 'en', user_lang)
+        return {'response': response, 'chat_history': user_data['chat_history'], 'is_translating': False}, 200
+
+    original_message = user_message
+    is_translating = user_lang != 'en'
+    if is_translating:
+        with STAGE_SECONDS.time('translate_in'):
+            user_message = (await translate(user_message, user_lang, 'en')).lower()
+
+    intent, mood, tone = await analyze_message(user_message)
+    INTENTS.inc(intent)
+    (await resource(chat_app.behavior_analytics)).record(user_message, intent, mood, tone)
+
+    # Recommendations wait for the catalogs while they load, rank candidates
+    # and save exclusions, so the reply is composed off the loop
+    parts = await run_io(chat_app.compose_reply, user_message, user_lang, user_data, intent, mood, tone)
+    if user_lang != 'en':
+        with STAGE_SECONDS.time('translate_out'):
+            parts = await asyncio.gather(*(translate(part, 'en', user_lang) for part in parts))
+    response = ' '.join(parts)
+
+    chat_app.add_to_history(user_data, original_message, response, mood, tone,
+                            chat_app.message_topic(original_message), intent)
+    user_state.save(user_id, user_data)
+
+    chat_log.info("Buddy's response: %s", response)
+    return {'response': response, 'chat_history': user_data['chat_history'], 'is_translating': is_translating}, 200
+
+
+async def handle_feedback(data):
+    if not data:
+        return {"error": "Invalid JSON format"}, 400
+    parsed, error = chat_app.parse_feedback_request(data)
+    if error:
+        return error, 400
+    user_id, recommendation_title, rating = parsed
+
+    user_state = await resource(chat_app.user_state)
+    user_data = await run_io(user_state.load, user_id)
+    chat_app.apply_feedback(user_data, recommendation_title, rating)
+    user_state.save(user_id, user_data)
+    return {"status": "Feedback recorded"}, 200
+
+
+async def handle_recommendations(data):
+    # No model work on this path; the user read, ranking and translations
+    # all block, so the whole handler runs on the I/O pool
+    return await run_io(chat_app.handle_recommendations, data)
+
+
+async def home(request):
+    return PlainTextResponse("Welcome to RecoBuddy!")
+
+
+async def instrumented(endpoint, handler, request):
+    # Request timing and status counts, plus the sampled cProfile mode
+    # (covering the request's work on the I/O and model pools)
+    sample_request()
+    profiler = chat_app.profiler.start()
+    token = current_profile.set(profiler)
+    try:
+        with REQUEST_SECONDS.time(endpoint):
+            try:
+                payload, status = await handler(await read_json(request))
+            except Exception as e:
+                chat_log.exception("%s error: %s", endpoint, e)
+                payload = {"error": "Internal Server Error", "details": str(e)}
+                if endpoint == 'chat':
+                    payload['is_translating'] = False
+                status = 500
+    finally:
+        current_profile.reset(token)
+        if profiler is not None:
+            chat_app.profiler.finish(endpoint, profiler)
+    REQUESTS.inc(endpoint, str(status))
+    return JSONResponse(payload, status_code=status)
+
+
+async def chat(request):
+    return await instrumented('chat', handle_chat, request)
+
+
+async def feedback(request):
+    return await instrumented('feedback', handle_feedback, request)
+
+
+async def recommendations(request):
+    return await instrumented('recommendations', handle_recommendations, request)
+
+
+async def stats(request):
+    intent_cache = await resource(chat_app.intent_cache)
+    behavior_analytics = await resource(chat_app.behavior_analytics)
+    return JSONResponse({'intent_cache': intent_cache.stats(), 'behavior_analytics': behavior_analytics.stats()})
+
+
+async def metrics(request):
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+async def healthz(request):
+    # Liveness: the event loop is serving requests
+    return JSONResponse({'status': 'ok'})
+
+
+async def readyz(request):
+    # Readiness: models, catalogs and clients are loaded, with per-stage timings
+    status = chat_app.startup.status()
+    return JSONResponse(status, status_code=200 if status['status'] == 'ready' else 503)
+
+
+@asynccontextmanager
+async def lifespan(application):
+    # Load everything in the background; requests are served meanwhile
+    chat_app.startup.warm_up()
+    yield
+    io_executor.shutdown(wait=False)
+    model_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/', home),
+        Route('/chat', chat, methods=['POST']),
+        Route('/feedback', feedback, methods=['POST']),
+        Route('/recommendations', recommendations, methods=['POST']),
+        Route('/stats', stats),
+        Route('/metrics', metrics),
+        Route('/healthz', healthz),
+        Route('/readyz', readyz),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['GET', 'POST', 'OPTIONS'],
+                           allow_headers=['Content-Type', 'Authorization'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,313 @@
+# End-to-end benchmark of the /chat pipeline, in-process and offline. Firestore,
+# Firebase auth, googletrans and the BART intent model are replaced by the
+# stand-ins in fakes.py; the catalogs are synthetic CSVs loaded through
+# data_loader. Replays a mix of greetings, knowledge-base questions,
+# recommendation requests (with and without a rating), non-English and
+# invalid messages through the Flask view, then times generate_recommendation
+# on its own. Results (throughput, latency percentiles, per-stage times, peak
+# RSS) are written as JSON so runs on different commits can be compared:
+#   python benchmarks/bench_chat.py --rows 100000 --requests 2000 --concurrency 8
+#   python benchmarks/bench_chat.py --latency translate=0 model_overhead=0.05
+#   python benchmarks/bench_chat.py --compare benchmarks/results/chat-abc1234-....json
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import fakes
+import synthetic_data
+from measurements import git_revision, peak_rss_mb, summarize
+
+MIX = {
+    'greeting': 0.12,
+    'question': 0.13,
+    'recommendation': 0.25,
+    'rated': 0.10,
+    'non_english': 0.15,
+    'statement': 0.15,
+    'invalid': 0.07,
+    'welcome': 0.03,
+}
+GREETINGS = ['hello', 'hi there', 'hey buddy', 'good morning']
+MOODS = ['', 'happy ', 'sad ', 'fun ', 'calm ']
+CATEGORIES = ['book', 'movie', 'song', 'music', 'novel', 'film']
+NON_ENGLISH = [
+    ('recommander un film', 'fr'), ('je veux un livre triste', 'fr'), ('recomienda un libro', 'es'),
+    ('quiero una película feliz', 'es'), ('पुस्तक की अनुशंसा करें', 'hi'), ('hola', 'es'),
+]
+INVALID = ['aaaaaaaaaa', '!!! ???', 'go go go go go', 'zzzzzzzz please']
+WORDS = ['i', 'had', 'a', 'long', 'day', 'at', 'work', 'the', 'weather', 'is', 'nice', 'my', 'cat',
+         'likes', 'rain', 'weekend', 'plans', 'coffee', 'tonight', 'friends', 'quiet', 'today']
+
+
+def make_message(kind, rng, questions):
+    if kind == 'greeting':
+        return rng.choice(GREETINGS), 'en'
+    if kind == 'question':
+        return rng.choice(questions), 'en'
+    if kind == 'recommendation':
+        return f"recommend a {rng.choice(MOODS)}{rng.choice(CATEGORIES)}", 'en'
+    if kind == 'rated':
+        return f"{rng.choice([3.5, 4, 4.2, 4.5, 4.8])} rating {rng.choice(['book', 'movie'])}", 'en'
+    if kind == 'non_english':
+        return rng.choice(NON_ENGLISH)
+    if kind == 'invalid':
+        return rng.choice(INVALID), 'en'
+    if kind == 'welcome':
+        return '', rng.choice(['en', 'en', 'fr'])
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))), 'en'
+
+
+def prepare_data(workdir, rows, seed):
+    # The CSVs are reused when the directory already holds the same dataset
+    marker = os.path.join(workdir, 'dataset.json')
+    dataset = {'rows': rows, 'seed': seed}
+    try:
+        with open(marker, encoding='utf-8') as f:
+            if json.load(f) == dataset:
+                return False
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(os.path.join(workdir, 'catalog_snapshots'), ignore_errors=True)
+    synthetic_data.write_music_csv(os.path.join(workdir, 'spotify_tracks.csv'), rows, seed)
+    synthetic_data.write_movie_csv(os.path.join(workdir, 'netflix_movies.csv'), rows, seed + 1)
+    synthetic_data.write_book_csv(os.path.join(workdir, 'books.csv'), rows, seed + 2)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump(dataset, f)
+    return True
+
+
+def stage_means(histogram):
+    with histogram.lock:
+        series = {labels: (total, count) for labels, (_, total, count) in histogram.series.items()}
+    return {labels[0]: {'count': count, 'mean_ms': round(total / count * 1000, 3)}
+            for labels, (total, count) in sorted(series.items()) if count}
+
+
+def run_chat(app, args, questions):
+    # --concurrency workers send --requests messages in total from --users users
+    latencies = {kind: [] for kind in MIX}
+    errors = []
+    lock = threading.Lock()
+    kinds, weights = zip(*MIX.items())
+    per_worker = [args.requests // args.concurrency + (i < args.requests % args.concurrency) for i in range(args.concurrency)]
+
+    def worker(n):
+        rng = random.Random(args.seed * 1000 + n)
+        for _ in range(per_worker[n]):
+            kind = rng.choices(kinds, weights)[0]
+            message, language = make_message(kind, rng, questions)
+            body = {'message': message, 'language': language, 'user_id': f"bench-user-{rng.randrange(args.users)}"}
+            started = time.perf_counter()
+            with app.app.test_request_context('/chat', method='POST', json=body):
+                _, status = app.chat()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[kind].append(elapsed)
+                if status != 200:
+                    errors.append({'kind': kind, 'message': message, 'status': status})
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    every = [value for values in latencies.values() for value in values]
+    return {
+        'requests': len(every),
+        'errors': len(errors),
+        'error_samples': errors[:5],
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(len(every) / seconds, 2),
+        'latency': summarize(every),
+        'by_kind': {kind: summarize(values) for kind, values in latencies.items()},
+    }
+
+
+def run_recommendations(app, args):
+    # generate_recommendation alone, single-threaded, for a fresh user, a
+    # rated request and a user whose likes switch on similarity ranking, and
+    # pages of five from /recommendations
+    rng = random.Random(args.seed)
+    user_data = app.user_state.get().load('bench-recommendations')
+    liked = []
+    for category in ('book', 'movie', 'music'):
+        for _ in range(5):
+            reply = app.generate_recommendation(f"recommend a {category}", 'en', user_data, None, 'neutral')
+            match = re.search(r"'([^']+)'", reply)
+            if match:
+                liked.append(match.group(1))
+    liked_data = app.user_state.get().load('bench-recommendations-liked')
+    liked_data['preferences']['liked'] = liked
+    variants = {
+        'plain': (lambda category: app.generate_recommendation(f"recommend a {category}", 'en', user_data, None, rng.choice(['happy', 'sad', 'neutral']))),
+        'rated': (lambda category: app.generate_recommendation(f"4.2 rating {category}", 'en', user_data, 4.2, 'neutral')),
+        'with_likes': (lambda category: app.generate_recommendation(f"recommend a {category}", 'en', liked_data, None, rng.choice(['happy', 'sad', 'neutral']))),
+    }
+    results = {}
+    for name, generate in variants.items():
+        latencies = []
+        for i in range(args.recommendations):
+            category = ('book', 'movie', 'music')[i % 3]
+            if name == 'rated' and category == 'music':
+                category = 'book'
+            started = time.perf_counter()
+            generate(category)
+            latencies.append(time.perf_counter() - started)
+        results[name] = summarize(latencies)
+
+    # /recommendations: a new pool across all categories, then the next page
+    first, following = [], []
+    for i in range(args.recommendations):
+        body = {'user_id': f"bench-batch-{i}", 'count': 5}
+        started = time.perf_counter()
+        payload, _ = app.handle_recommendations(body)
+        first.append(time.perf_counter() - started)
+        if payload.get('next_cursor'):
+            started = time.perf_counter()
+            app.handle_recommendations(dict(body, cursor=payload['next_cursor']))
+            following.append(time.perf_counter() - started)
+    results['batch_first_page'] = summarize(first)
+    results['batch_next_page'] = summarize(following)
+    return results
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nvs. {baseline_path} (commit {baseline.get('commit')})")
+    rows = [('chat throughput rps', ('chat', 'throughput_rps'), True),
+            ('chat p50 ms', ('chat', 'latency', 'p50_ms'), False),
+            ('chat p99 ms', ('chat', 'latency', 'p99_ms'), False),
+            ('peak RSS MB', ('peak_rss_mb', 'total'), False),
+            ('startup s', ('startup', 'seconds'), False)]
+    rows += [(f"{kind} p50 ms", ('chat', 'by_kind', kind, 'p50_ms'), False) for kind in MIX]
+    rows += [(f"recommend {name} p50 ms", ('recommendation', name, 'p50_ms'), False) for name in current['recommendation']]
+    for label, path, higher_is_better in rows:
+        old, new = baseline, current
+        for key in path:
+            old = old.get(key) if isinstance(old, dict) else None
+            new = new.get(key) if isinstance(new, dict) else None
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        worse = change < 0 if higher_is_better else change > 0
+        flag = '  <- regression' if worse and abs(change) >= 10 else ''
+        print(f"  {label:<32s} {old:>10.2f} -> {new:>10.2f}  {change:+6.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000, help='rows per synthetic catalog')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=50, help='unmeasured requests before the run')
+    parser.add_argument('--recommendations', type=int, default=300, help='generate_recommendation calls per variant')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', nargs='*', default=[], metavar='NAME=SECONDS',
+                        help=f"fake service latencies: {', '.join(fakes.LATENCY)}")
+    parser.add_argument('--workdir', help='keep the synthetic data here and reuse it across runs')
+    parser.add_argument('--output', help='results file (default benchmarks/results/chat-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    latency = {}
+    for setting in args.latency:
+        name, _, value = setting.partition('=')
+        latency[name] = float(value)
+    fakes.install(**latency)
+    random.seed(args.seed)
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='recobuddy-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    if not args.workdir:
+        # Registered before app is imported so it runs after app's exit handlers
+        atexit.register(shutil.rmtree, workdir, True)
+    generated = prepare_data(workdir, args.rows, args.seed)
+    # app reads these at import time and resolves the CSVs relative to the cwd
+    os.chdir(workdir)
+    os.environ['CATALOG_SNAPSHOT_DIR'] = os.path.join(workdir, 'catalog_snapshots')
+    os.environ['TRANSLATION_CACHE_DB'] = os.path.join(workdir, f"translation-{os.getpid()}.db")
+    os.environ['ANALYTICS_SINK'] = 'log'
+    os.environ['ANALYTICS_LOG_DIR'] = os.path.join(workdir, 'behavior_logs')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    for name in ('INTENT_SERVICE_URL', 'INTENT_CACHE_FILE', 'PROFILE_SAMPLE_RATE'):
+        os.environ.pop(name, None)
+
+    started = time.perf_counter()
+    import app
+    from metrics import STAGE_SECONDS
+    reporter = app.startup.warm_up()
+    reporter.join()
+    startup = app.startup.status()
+    startup_rss = peak_rss_mb()
+    if app.startup.failed:
+        sys.exit(f"Startup failed: {app.startup.failed}")
+    print(f"Startup {time.perf_counter() - started:.2f}s ({'new' if generated else 'reused'} data, {args.rows} rows per catalog)")
+
+    questions = [query for query in app.keyword_rules.current().knowledge_base if query == query.lower()]
+    warmup = argparse.Namespace(**dict(vars(args), requests=args.warmup, seed=args.seed + 1))
+    if args.warmup:
+        run_chat(app, warmup, questions)
+    chat = run_chat(app, args, questions)
+    recommendation = run_recommendations(app, args)
+    app.user_state.value.close()
+    app.behavior_analytics.value.close()
+
+    commit, dirty = git_revision()
+    results = {
+        'benchmark': 'chat',
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'latency', 'workdir')},
+        'latency_settings': dict(fakes.LATENCY),
+        'mix': MIX,
+        'startup': {'seconds': startup.get('seconds'), 'new_data': generated,
+                    'stages': {name: stage.get('seconds') for name, stage in startup['stages'].items()}},
+        'chat': chat,
+        'stages': stage_means(STAGE_SECONDS),
+        'recommendation': recommendation,
+        'peak_rss_mb': {'startup': startup_rss, 'total': peak_rss_mb()},
+        'services': fakes.stats(),
+    }
+
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results', f"chat-{commit or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    latency = chat['latency']
+    print(f"/chat: {chat['requests']} requests, {chat['errors']} errors, {chat['throughput_rps']} req/s, "
+          f"p50 {latency['p50_ms']:.1f} ms, p90 {latency['p90_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms")
+    for kind, summary in chat['by_kind'].items():
+        if summary['count']:
+            print(f"  {kind:<15s} n={summary['count']:<5d} p50 {summary['p50_ms']:8.1f} ms  p99 {summary['p99_ms']:8.1f} ms")
+    for name, summary in recommendation.items():
+        print(f"recommendations {name:<16s} p50 {summary['p50_ms']:.2f} ms  p99 {summary['p99_ms']:.2f} ms")
+    print(f"Peak RSS {results['peak_rss_mb']['total']} MB (after startup {startup_rss} MB)")
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Load generator for the intent engine. By default it uses the stand-in model
+# from fakes.py, whose cost is a fixed per-forward-pass overhead plus a
+# per-message cost, so batching effects are visible without downloading BART:
+#   python benchmarks/bench_intent.py --users 32 --requests 20
+#   python benchmarks/bench_intent.py --real              # facebook/bart-large-mnli
+#   python benchmarks/bench_intent.py --url http://127.0.0.1:5001
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_service import BatchingClassifier, IntentEngine, RemoteIntentClassifier, CANDIDATE_LABELS
+from fakes import TinyZeroShot
+from measurements import percentile
+
+MESSAGES = [
+    'hello', 'hi there', 'how are you', 'what is python', 'tell me a joke', 'i loved the last one',
+    'recommend a book', 'suggest a happy movie', 'can you recommend some music',
+    'i had a really long day at work and want to relax tonight', 'thanks that was great',
+]
+
+
+class UnbatchedClassifier:
+    # The previous behaviour: one pipeline call per message
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def classify(self, message):
+        return self.pipeline(message, CANDIDATE_LABELS, multi_label=False)['labels'][0]
+
+
+def run(engine, users, requests_per_user, seed=0):
+    latencies = []
+    lock = threading.Lock()
+
+    def user(n):
+        rng = random.Random(seed + n)
+        for _ in range(requests_per_user):
+            message = rng.choice(MESSAGES)
+            start = time.perf_counter()
+            engine.detect(message)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / wall,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def report(name, stats, engine):
+    print(f"{name:10s} {stats['requests']:5d} req  {stats['throughput']:8.1f} req/s  "
+          f"p50 {stats['p50_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+          f"model calls {engine.model_calls}, short-circuited {engine.short_circuits}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--overhead-ms', type=float, default=40, help='stub cost per forward pass')
+    parser.add_argument('--per-item-ms', type=float, default=8, help='stub cost per message in a batch')
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--real', action='store_true', help='use facebook/bart-large-mnli')
+    parser.add_argument('--url', help='benchmark a running intent service instead')
+    args = parser.parse_args()
+
+    if args.url:
+        engine = IntentEngine(RemoteIntentClassifier(args.url))
+        report('service', run(engine, args.users, args.requests), engine)
+        return
+
+    if args.real:
+        from transformers import pipeline
+        model = pipeline('zero-shot-classification', model='facebook/bart-large-mnli')
+    else:
+        model = TinyZeroShot(args.overhead_ms / 1000, args.per_item_ms / 1000)
+
+    engine = IntentEngine(UnbatchedClassifier(model))
+    report('unbatched', run(engine, args.users, args.requests), engine)
+    engine = IntentEngine(BatchingClassifier(model, args.max_batch, args.max_wait_ms / 1000))
+    report('batched', run(engine, args.users, args.requests), engine)
+
+
+if __name__ == '__main__':
+    main()
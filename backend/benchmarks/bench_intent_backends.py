@@ -0,0 +1,177 @@
+# Accuracy parity, load time, memory and latency of the intent backends
+# (INTENT_BACKENDS in intent_service.py), to pick one per deployment. The
+# messages are the held-out logged queries of intent_training.py; their
+# logged intents came from the production model, so parity is agreement
+# with it (after the keyword rules, as IntentEngine applies them). When bart
+# is measured too, agreement with its live predictions is reported as well.
+# Each backend runs in a fresh subprocess so load time and memory are
+# measured from a clean start. Run from the backend folder:
+#   python benchmarks/bench_intent_backends.py behavior_logs
+#   python benchmarks/bench_intent_backends.py behavior_logs --backends bart-int8 tfidf --limit 200
+#   python benchmarks/bench_intent_backends.py behavior_logs --fake-models   # plumbing only, no downloads
+# Train the tfidf model with the same --holdout first, so none of these
+# queries were in its training set.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from catalog import stable_hash
+from intent_service import INTENT_BACKENDS, IntentEngine, load_intent_classifier
+from intent_training import HOLDOUT, labeled_queries, read_events, split
+from measurements import git_revision, peak_rss_mb, summarize
+
+BATCH = 16
+
+
+def measure(backend, model, messages, fake_models):
+    # Runs in the child process
+    if fake_models:
+        import fakes
+        fakes.install()
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    classifier = load_intent_classifier(backend, model)
+    load_seconds = time.perf_counter() - started
+    loaded = peak_rss_mb()
+    engine = IntentEngine(classifier)
+    engine.detect(messages[0])
+
+    # One message at a time, as a single /chat request sends it
+    predictions, latencies = [], []
+    for message in messages:
+        started = time.perf_counter()
+        predictions.append(engine.detect(message))
+        latencies.append(time.perf_counter() - started)
+
+    # Messages arriving together, batched where the backend batches
+    started = time.perf_counter()
+    for i in range(0, len(messages), BATCH):
+        classifier.classify_many(messages[i:i + BATCH])
+    throughput = len(messages) / (time.perf_counter() - started)
+
+    return {
+        'model': model or INTENT_BACKENDS[backend],
+        'load_seconds': round(load_seconds, 3),
+        'rss_mb': {'before_load': baseline, 'after_load': loaded, 'peak': peak_rss_mb()},
+        'latency': summarize(latencies),
+        'batched_messages_per_second': round(throughput, 1),
+        'info': getattr(classifier, 'info', None),
+        'predictions': predictions,
+    }
+
+
+def run_child(backend, model, messages_path, fake_models):
+    command = [sys.executable, os.path.abspath(__file__), '--child', backend, '--messages', messages_path]
+    if model:
+        command += ['--model', f"{backend}={model}"]
+    if fake_models:
+        command.append('--fake-models')
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'error': (result.stderr.strip().splitlines() or ['failed'])[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def agreement(predictions, reference):
+    if not reference:
+        return None
+    return round(sum(a == b for a, b in zip(predictions, reference)) / len(reference), 4)
+
+
+def per_label(predictions, expected):
+    totals, matches = Counter(expected), Counter(e for p, e in zip(predictions, expected) if p == e)
+    return {label: round(matches[label] / count, 4) for label, count in sorted(totals.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('logs', nargs='*', help='behavior log files or directories')
+    parser.add_argument('--backends', nargs='+', default=list(INTENT_BACKENDS), choices=list(INTENT_BACKENDS))
+    parser.add_argument('--model', action='append', default=[], metavar='BACKEND=MODEL',
+                        help='override a backend model (or the tfidf model file)')
+    parser.add_argument('--holdout', type=float, default=HOLDOUT, help='must match the tfidf training run')
+    parser.add_argument('--limit', type=int, default=500, help='held-out queries to use (zero-shot models are slow)')
+    parser.add_argument('--fake-models', action='store_true', help='use the stand-in pipeline from fakes.py')
+    parser.add_argument('--output', help='results file (default benchmarks/results/intent-backends-<commit>-<time>.json)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--messages', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    models = dict(setting.split('=', 1) for setting in args.model)
+
+    if args.child:
+        with open(args.messages, encoding='utf-8') as f:
+            messages = json.load(f)
+        print(json.dumps(measure(args.child, models.get(args.child), messages, args.fake_models)))
+        return
+
+    if not args.logs:
+        parser.error('the behavior logs are required')
+    examples = labeled_queries(read_events(args.logs))
+    _, holdout = split(examples, args.holdout)
+    # A stable subset, so runs on different commits see the same queries
+    queries = sorted(holdout, key=stable_hash)[:args.limit]
+    if not queries:
+        sys.exit('No held-out queries in the logs')
+    expected = [holdout[query] for query in queries]
+    print(f"{len(queries)} held-out queries of {len(examples)}: {dict(Counter(expected))}")
+
+    fd, messages_path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(queries, f)
+    results = {}
+    try:
+        for backend in args.backends:
+            print(f"Measuring {backend}...", flush=True)
+            results[backend] = run_child(backend, models.get(backend), messages_path, args.fake_models)
+    finally:
+        os.remove(messages_path)
+
+    reference = results.get('bart', {}).get('predictions')
+    print(f"\n{'backend':<10s} {'load s':>7s} {'RSS MB':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'batched/s':>10s} "
+          f"{'parity':>7s} {'vs bart':>8s}")
+    for backend, result in results.items():
+        if 'error' in result:
+            print(f"{backend:<10s} failed: {result['error']}")
+            continue
+        predictions = result['predictions']
+        result['parity'] = agreement(predictions, expected)
+        result['parity_by_label'] = per_label(predictions, expected)
+        result['parity_with_bart'] = agreement(predictions, reference) if reference and backend != 'bart' else None
+        info = result.get('info') or {}
+        if 'holdout' in info and info['holdout'] != args.holdout:
+            print(f"warning: {backend} was trained with --holdout {info['holdout']}, some queries may be in its training set")
+        vs_bart = f"{result['parity_with_bart']:.1%}" if result['parity_with_bart'] is not None else '-'
+        print(f"{backend:<10s} {result['load_seconds']:7.2f} {result['rss_mb']['peak'] or 0:8.1f} "
+              f"{result['latency']['p50_ms']:8.2f} {result['latency']['p99_ms']:8.2f} "
+              f"{result['batched_messages_per_second']:10.1f} {result['parity']:7.1%} {vs_bart:>8s}")
+
+    commit, dirty = git_revision()
+    report = {
+        'benchmark': 'intent_backends',
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'fake_models': args.fake_models,
+        'holdout': args.holdout,
+        'queries': len(queries),
+        'labels': dict(Counter(expected)),
+        'backends': results,
+    }
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results', f"intent-backends-{commit or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Rule-layer cost per message as the knowledge base grows: the previous
+# substring scans (knowledge base loop, chained category checks,
+# recommendation any(), profanity regex compiled per call) vs. one
+# KeywordMatcher pass. Run from the backend folder:
+#   python benchmarks/bench_keywords.py --sizes 16 100 1000 5000
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KEYWORDS_FILE, KeywordMatcher
+
+WORDS = ['night', 'river', 'stone', 'light', 'dream', 'city', 'heart', 'summer', 'shadow', 'garden',
+         'fire', 'ocean', 'road', 'song', 'winter', 'star', 'glass', 'silver', 'what', 'how', 'is']
+
+
+def grow_config(config, size, rng):
+    config = dict(config, knowledge_base=dict(config['knowledge_base']))
+    while len(config['knowledge_base']) < size:
+        query = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 6))) + f" {len(config['knowledge_base'])}"
+        config['knowledge_base'][query] = f"Answer {len(config['knowledge_base'])}"
+    return config
+
+
+def legacy_rules(config, message):
+    answer = None
+    for query, value in config['knowledge_base'].items():
+        if query in message:
+            answer = value
+            break
+    category = 'book'
+    for name, keywords in config['categories'].items():
+        if any(keyword in message for keyword in keywords):
+            category = name
+            break
+    recommendation = any(keyword in message for keyword in config['recommendation'])
+    pattern = re.compile(r"\b(" + '|'.join(config['profanity']) + r")\b", re.IGNORECASE)
+    profanity = bool(pattern.search(message))
+    return answer, category, recommendation, profanity
+
+
+def matcher_rules(matcher, message):
+    hits = matcher._scan(message)
+    return (hits.first('knowledge_base'), hits.first('category', 'book'),
+            'recommendation' in hits, 'profanity' in hits)
+
+
+def timed(fn, messages):
+    started = time.perf_counter()
+    for message in messages:
+        fn(message)
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 100, 1000, 5000])
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(KEYWORDS_FILE, encoding='utf-8') as f:
+        base = json.load(f)
+    rng = random.Random(0)
+    for size in args.sizes:
+        config = grow_config(base, size, rng)
+        queries = list(config['knowledge_base'])
+        messages = []
+        for _ in range(args.messages):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(3, 12))]
+            if rng.random() < 0.3:
+                words.append(rng.choice(queries))
+            if rng.random() < 0.3:
+                words += ['recommend', 'a', rng.choice(['book', 'movie', 'song'])]
+            messages.append(' '.join(words))
+
+        started = time.perf_counter()
+        matcher = KeywordMatcher(config)
+        build = (time.perf_counter() - started) * 1000
+        assert all(legacy_rules(config, m) == matcher_rules(matcher, m) for m in messages[:200])
+        legacy = timed(lambda m: legacy_rules(config, m), messages)
+        compiled = timed(lambda m: matcher_rules(matcher, m), messages)
+        print(f"{len(config['knowledge_base']):>6d} kb entries  legacy {legacy:8.1f} us/msg  "
+              f"matcher {compiled:6.1f} us/msg  ({legacy / compiled:5.1f}x)  build {build:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
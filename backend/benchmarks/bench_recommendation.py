@@ -0,0 +1,94 @@
+# Microbenchmark: RecommendationIndex vs. the previous list-scan filtering in
+# generate_recommendation. Run from the backend folder:
+#   python benchmarks/bench_recommendation.py --rows 200000
+import argparse
+import os
+import random
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import Catalog
+from recommendation_index import RecommendationIndex
+
+
+def make_books(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'book_title': f"Book {i}",
+        'book_author': f"Author {i % 997}",
+        'Category': "['Fiction']",
+        'Summary': f"A story about Book {i}. (Summary not available in dataset.)",
+        'emotion': rng.choice(['happy', 'sad', 'neutral']),
+        'year_of_publication': 1900 + i % 120,
+        'rating': round(rng.uniform(2.5, 5.0), 2),
+    } for i in range(n)]
+
+
+# Previous implementation, kept here as the baseline
+def legacy_candidates(data, disliked, previously_recommended, emotion, requested_rating):
+    key = 'book_title'
+    available = [rec for rec in data if rec[key] not in disliked and
+                 rec[key] not in previously_recommended and
+                 rec['emotion'] == emotion]
+    if requested_rating is not None:
+        exact_matches = [rec for rec in available if float(rec.get('rating', 0)) >= requested_rating]
+        if exact_matches:
+            available = exact_matches
+        else:
+            threshold = max(0, requested_rating - 0.5)
+            available = [rec for rec in available if float(rec.get('rating', 0)) >= threshold]
+    available = [rec for rec in available if rec['book_title'] and rec['book_title'].lower() != 'nan']
+    random.shuffle(available)
+    return available
+
+
+def index_candidates(index, disliked, previously_recommended, emotion, requested_rating):
+    excluded = set(disliked)
+    excluded.update(previously_recommended)
+    available = index.candidates('book', emotion, excluded)
+    if requested_rating is not None:
+        exact_matches = available.with_min_rating(requested_rating)
+        available = exact_matches if exact_matches else available.with_min_rating(max(0, requested_rating - 0.5))
+    return available.with_valid_titles()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--history', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    books = make_books(args.rows)
+    catalog = Catalog.from_frame(pd.DataFrame(books), categorical=('Category', 'emotion'))
+    start = time.perf_counter()
+    index = RecommendationIndex({'book': catalog})
+    build = time.perf_counter() - start
+
+    disliked = [f"Book {i}" for i in range(0, args.history * 7, 7)]
+    previously_recommended = [f"Book {i}" for i in range(1, args.history * 3, 3)]
+
+    print(f"{args.rows} books, {len(disliked)} disliked, {len(previously_recommended)} previously recommended")
+    print(f"index build: {build * 1000:.1f} ms")
+    for rating in (None, 4.5, 5.5):
+        legacy = legacy_candidates(books, disliked, previously_recommended, 'neutral', rating)
+        indexed = index_candidates(index, disliked, previously_recommended, 'neutral', rating)
+        assert {r['book_title'] for r in legacy} == {r['book_title'] for r in indexed}
+
+        old = timed(lambda: legacy_candidates(books, disliked, previously_recommended, 'neutral', rating), args.repeat)
+        new = timed(lambda: index_candidates(index, disliked, previously_recommended, 'neutral', rating).sample(), args.repeat)
+        print(f"rating={rating}: legacy {old * 1000:.2f} ms, index {new * 1000:.3f} ms ({old / new:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Similarity ranking cost at several catalog sizes: feature build time,
+# matrix size, and per-request selection latency (query vector + one
+# matrix-vector product + argpartition top-k) next to the uniform pick from
+# RecommendationIndex. Run from the backend folder:
+#   python benchmarks/bench_similarity.py
+#   python benchmarks/bench_similarity.py --sizes 10000 100000 1000000 --categories music movie
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import load_music_data, load_movie_data, load_book_data
+from recommendation_index import RecommendationIndex, TITLE_KEYS
+from similarity import SimilarityEngine, build_features
+import synthetic_data
+from measurements import percentile
+
+CATEGORIES = {
+    'music': (synthetic_data.write_music_csv, load_music_data),
+    'movie': (synthetic_data.write_movie_csv, load_movie_data),
+    'book': (synthetic_data.write_book_csv, load_book_data),
+}
+
+
+def bench(category, rows, requests, k, data_dir):
+    writer, loader = CATEGORIES[category]
+    path = os.path.join(data_dir, f"{category}-{rows}.csv")
+    writer(path, rows)
+    catalog = loader(path)
+
+    started = time.perf_counter()
+    matrix = build_features(category, catalog)
+    build = time.perf_counter() - started
+    engine = SimilarityEngine({category: catalog}, features={category: matrix})
+    index = RecommendationIndex({category: catalog})
+
+    rng = random.Random(1)
+    key = TITLE_KEYS[category]
+    similar, uniform = [], []
+    for _ in range(requests):
+        liked = [catalog[rng.randrange(len(catalog))][key] for _ in range(5)]
+        seen = [catalog[rng.randrange(len(catalog))][key] for _ in range(20)]
+        emotion = rng.choice(['happy', 'sad', 'neutral'])
+
+        started = time.perf_counter()
+        available = index.candidates(category, emotion, set(seen))
+        query = engine.query(category, engine.liked_rows(category, liked), emotion)
+        engine.top_k(category, query, k, rows=available.rows())
+        similar.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        available = index.candidates(category, emotion, set(seen))
+        if available:
+            available.sample(rng)
+        uniform.append(time.perf_counter() - started)
+
+    print(f"{category:6s} {len(catalog):>9d} rows  {matrix.shape[1]:>6d} features  {engine.nbytes() / 2**20:7.1f} MiB  "
+          f"build {build:7.2f}s  similar p50 {statistics.median(similar) * 1000:7.2f} ms "
+          f"p99 {percentile(similar, 0.99) * 1000:7.2f} ms  uniform p50 {statistics.median(uniform) * 1000:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--categories', nargs='+', default=['music', 'movie', 'book'], choices=sorted(CATEGORIES))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        for rows in args.sizes:
+            for category in args.categories:
+                bench(category, rows, args.requests, args.k, data_dir)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
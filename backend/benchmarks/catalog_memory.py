@@ -0,0 +1,73 @@
+# Resident size of the catalogs as Catalog objects vs. the previous list of
+# dicts from DataFrame.to_dict('records'), and the peak memory of loading a
+# CSV as one frame vs. streaming it into a snapshot in chunks. Run from the
+# backend folder with the real CSVs present, or pass --synthetic N to
+# generate stand-ins:
+#   python benchmarks/catalog_memory.py
+#   python benchmarks/catalog_memory.py --synthetic 100000
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import load_music_data, load_movie_data, load_book_data, build_snapshot
+import synthetic_data
+
+
+def retained(fn):
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def peak(fn):
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--synthetic', type=int, default=0, help='rows per generated CSV')
+    parser.add_argument('--data-dir', default='.')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if args.synthetic:
+        data_dir = tempfile.mkdtemp()
+        synthetic_data.write_music_csv(os.path.join(data_dir, 'spotify_tracks.csv'), args.synthetic)
+        synthetic_data.write_movie_csv(os.path.join(data_dir, 'netflix_movies.csv'), args.synthetic)
+        synthetic_data.write_book_csv(os.path.join(data_dir, 'books.csv'), args.synthetic)
+
+    total_before = total_after = 0
+    for name, loader, path in [('music', load_music_data, 'spotify_tracks.csv'),
+                               ('movie', load_movie_data, 'netflix_movies.csv'),
+                               ('book', load_book_data, 'books.csv')]:
+        catalog, after = retained(lambda: loader(os.path.join(data_dir, path)))
+        # list(catalog) yields the same dicts DataFrame.to_dict('records') produced
+        records, before = retained(lambda: list(catalog))
+        total_before += before
+        total_after += after
+        print(f"{name:6s} {len(catalog):>8d} rows  records {before / 2**20:8.1f} MiB  "
+              f"catalog {after / 2**20:8.1f} MiB  ({before / max(after, 1):.1f}x)")
+        del records, catalog
+        whole = peak(lambda: loader(os.path.join(data_dir, path)))
+        streamed = peak(lambda: build_snapshot(name, os.path.join(data_dir, path), tempfile.mkdtemp()))
+        print(f"{'':6s} peak while loading: whole frame {whole / 2**20:8.1f} MiB  "
+              f"chunked into snapshot {streamed / 2**20:8.1f} MiB")
+    print(f"total  records {total_before / 2**20:.1f} MiB  catalog {total_after / 2**20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# In-process stand-ins for the external services the /chat pipeline talks to,
+# so benchmarks run offline and give the same numbers on every machine:
+# Firestore and Firebase auth (firebase_admin), googletrans and the
+# zero-shot BART pipeline (transformers). Each call sleeps for a configurable
+# latency instead of doing network or model work. install() must run before
+# app is imported.
+import copy
+import itertools
+import sys
+import threading
+import time
+import types
+
+# Seconds per call; override with install(**latency)
+LATENCY = {
+    'firestore_read': 0.004,
+    'firestore_commit': 0.012,
+    'auth_lookup': 0.03,
+    'translate': 0.06,
+    'model_load': 0.0,
+    'model_overhead': 0.02,    # per forward pass
+    'model_per_item': 0.008,   # per message in the batch
+}
+
+
+def _wait(name):
+    if LATENCY[name] > 0:
+        time.sleep(LATENCY[name])
+
+
+class ArrayUnion:
+    def __init__(self, values):
+        self.values = list(values)
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+def _apply(doc, path, value):
+    *parents, field = path.split('.')
+    for name in parents:
+        doc = doc.setdefault(name, {})
+    if isinstance(value, ArrayUnion):
+        current = doc.setdefault(field, [])
+        current.extend(item for item in value.values if item not in current)
+    elif isinstance(value, Increment):
+        doc[field] = doc.get(field, 0) + value.value
+    else:
+        doc[field] = copy.deepcopy(value)
+
+
+def _merge(doc, data):
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(doc.get(key), dict):
+            _merge(doc[key], value)
+        else:
+            _apply(doc, key, value)
+
+
+class Snapshot:
+    def __init__(self, data):
+        self.data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self.data)
+
+
+class DocumentReference:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def get(self):
+        _wait('firestore_read')
+        with self.db.lock:
+            self.db.reads += 1
+            return Snapshot(copy.deepcopy(self.db.documents.get(self.path)))
+
+    def collection(self, name):
+        return CollectionReference(self.db, f"{self.path}/{name}")
+
+
+class CollectionReference:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def document(self, document_id=None):
+        return DocumentReference(self.db, f"{self.path}/{document_id or self.db.auto_id()}")
+
+
+class WriteBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append(('set', ref.path, data, merge))
+
+    def update(self, ref, updates):
+        self.writes.append(('update', ref.path, updates, False))
+
+    def commit(self):
+        _wait('firestore_commit')
+        with self.db.lock:
+            for kind, path, data, merge in self.writes:
+                if kind == 'set' and not merge:
+                    self.db.documents[path] = {}
+                doc = self.db.documents.get(path)
+                if doc is None:
+                    if kind == 'update':
+                        raise KeyError(f"No document to update: {path}")
+                    doc = self.db.documents[path] = {}
+                if kind == 'update':
+                    for field, value in data.items():
+                        _apply(doc, field, value)
+                else:
+                    _merge(doc, data)
+            self.db.commits += 1
+            self.db.writes += len(self.writes)
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.documents = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def auto_id(self):
+        return f"auto{next(self.ids):012d}"
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def stats(self):
+        with self.lock:
+            return {'documents': len(self.documents), 'reads': self.reads, 'writes': self.writes, 'commits': self.commits}
+
+
+class FakeAuth:
+    def __init__(self):
+        self.lookups = 0
+
+    def get_user(self, uid):
+        _wait('auth_lookup')
+        self.lookups += 1
+        return types.SimpleNamespace(uid=uid, email=f"{uid}@example.com")
+
+
+class FakeTranslator:
+    # googletrans.Translator; the "translation" tags the text with the target
+    # language so the pipeline's lowercasing and keyword matching still work
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text, src='auto', dest='en'):
+        _wait('translate')
+        self.calls += 1
+        return types.SimpleNamespace(text=text if dest == 'en' else f"[{dest}] {text}", src=src, dest=dest)
+
+
+# Keyword heuristics standing in for the NLI model's judgement
+INTENT_HINTS = [
+    ('greeting', ('hello', 'hi ', 'hey', 'good morning')),
+    ('feedback', ('loved', 'liked', 'hated', 'thanks', 'great')),
+    ('recommendation', ('recommend', 'suggest', 'looking for')),
+    ('question', ('what', 'how', 'why', 'who', '?')),
+    ('complex_query', ('explain', 'compare', 'difference')),
+]
+
+
+class TinyZeroShot:
+    # Same call signature and result shape as the transformers
+    # zero-shot-classification pipeline. Forward passes are serialized like
+    # a single CPU-bound model instance; overhead and per_item (seconds)
+    # default to LATENCY['model_overhead'] and LATENCY['model_per_item'].
+    def __init__(self, overhead=None, per_item=None):
+        self.overhead = overhead
+        self.per_item = per_item
+        self.lock = threading.Lock()
+        self.forward_passes = 0
+        self.messages = 0
+
+    def label(self, message, labels):
+        padded = f" {message} "
+        for label, hints in INTENT_HINTS:
+            if label in labels and any(hint in padded for hint in hints):
+                return label
+        return 'statement' if 'statement' in labels else labels[0]
+
+    def __call__(self, sequences, candidate_labels, multi_label=False, batch_size=None):
+        single = isinstance(sequences, str)
+        batch = [sequences] if single else list(sequences)
+        with self.lock:
+            overhead = LATENCY['model_overhead'] if self.overhead is None else self.overhead
+            per_item = LATENCY['model_per_item'] if self.per_item is None else self.per_item
+            time.sleep(overhead + per_item * len(batch))
+            self.forward_passes += 1
+            self.messages += len(batch)
+        results = []
+        for message in batch:
+            best = self.label(message, candidate_labels)
+            rest = [label for label in candidate_labels if label != best]
+            share = 0.2 / max(1, len(rest))
+            results.append({'sequence': message, 'labels': [best] + rest, 'scores': [0.8] + [share] * len(rest)})
+        return results[0] if single else results
+
+
+def pipeline(task, model=None, **kwargs):
+    _wait('model_load')
+    instance = TinyZeroShot()
+    pipelines.append(instance)
+    return instance
+
+
+db = FakeFirestore()
+auth = FakeAuth()
+translators = []
+pipelines = []
+
+
+def _translator():
+    translator = FakeTranslator()
+    translators.append(translator)
+    return translator
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install(**latency):
+    # Registers the fake firebase_admin, googletrans and transformers modules
+    unknown = set(latency) - set(LATENCY)
+    if unknown:
+        raise ValueError(f"Unknown latency settings: {sorted(unknown)}")
+    LATENCY.update(latency)
+    credentials = _module('firebase_admin.credentials', Certificate=lambda path: None)
+    firestore = _module('firebase_admin.firestore', client=lambda app=None: db, ArrayUnion=ArrayUnion, Increment=Increment)
+    auth_module = _module('firebase_admin.auth', get_user=auth.get_user)
+    _module('firebase_admin', initialize_app=lambda credential=None, options=None: None,
+            credentials=credentials, firestore=firestore, auth=auth_module)
+    _module('googletrans', Translator=_translator)
+    _module('transformers', pipeline=pipeline)
+
+
+def stats():
+    return {
+        'firestore': db.stats(),
+        'auth_lookups': auth.lookups,
+        'translations': sum(translator.calls for translator in translators),
+        'model_forward_passes': sum(p.forward_passes for p in pipelines),
+        'model_messages': sum(p.messages for p in pipelines),
+    }
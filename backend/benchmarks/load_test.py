@@ -0,0 +1,84 @@
+# Concurrent-user load test against a running server, e.g. to compare the
+# Flask server with the ASGI mode:
+#   python app.py                                  # port 5000
+#   python benchmarks/load_test.py --url http://127.0.0.1:5000 --users 50
+#   uvicorn asgi:app --port 8000
+#   python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 50
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from measurements import percentile
+
+MESSAGES = [
+    ('hello', 'en'), ('recommend a book', 'en'), ('suggest a happy movie', 'en'),
+    ('i feel sad, recommend some music', 'en'), ('4.5 rating book', 'en'), ('what is python', 'en'),
+    ('tell me a joke', 'en'), ('recommander un film', 'fr'), ('recomienda un libro', 'es'),
+    ('पुस्तक की अनुशंसा करें', 'hi'), ('aaaaaaaaaa', 'en'), ('', 'en'),
+]
+
+
+def post(url, body, timeout):
+    req = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+        return resp.status
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20, help='requests per user')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def user(n):
+        rng = random.Random(n)
+        for _ in range(args.requests):
+            message, language = rng.choice(MESSAGES)
+            body = {'message': message, 'language': language, 'user_id': f"loadtest-{n}"}
+            start = time.perf_counter()
+            try:
+                post(args.url.rstrip('/') + '/chat', body, args.timeout)
+                ok = True
+            except (urllib.error.URLError, OSError) as e:
+                ok = False
+                error = str(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(error)
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(args.users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    if not latencies:
+        print(f"all {len(errors)} requests failed, e.g. {errors[0]}")
+        return
+    print(f"{args.users} users x {args.requests} requests against {args.url}")
+    print(f"  ok {len(latencies)}, errors {len(errors)}, wall {wall:.1f} s")
+    print(f"  throughput {len(latencies) / wall:.1f} req/s")
+    print(f"  p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+          f"p90 {percentile(latencies, 0.9) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Synthetic CSVs with the same columns as spotify_tracks.csv, netflix_movies.csv
+# and books.csv, for benchmarks that cannot ship the real datasets.
+import csv
+import random
+
+GENRES = ['Comedies', 'Romantic Movies', 'Dramas', 'Documentaries', 'Action & Adventure',
+          'Horror Movies', 'Thrillers', 'International Movies', 'Children & Family Movies']
+MATURITY = ['TV-MA', 'TV-14', 'PG-13', 'R', 'TV-PG', 'PG', 'G', '']
+WORDS = ['night', 'river', 'stone', 'light', 'dream', 'city', 'heart', 'summer', 'shadow',
+         'garden', 'fire', 'ocean', 'road', 'song', 'winter', 'star', 'glass', 'silver']
+SERIES = ['Hunger Games', 'Harry Potter', 'Twilight', 'The Hobbit', 'The Great Gatsby']
+
+
+def _phrase(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def write_music_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'album', 'artists', 'track_number', 'danceability', 'energy',
+                         'valence', 'tempo', 'year', 'release_date'])
+        for i in range(rows):
+            year = rng.randint(1960, 2023)
+            writer.writerow([f"trk{i:08d}", f"{_phrase(rng, 2).title()} {i}", _phrase(rng, 2).title(),
+                             f"['Artist {i % 5003}']", rng.randint(1, 20), round(rng.random(), 3),
+                             round(rng.random(), 3), round(rng.random(), 3), round(rng.uniform(60, 180), 2),
+                             year, f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"])
+
+
+def write_movie_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['show_id', 'type', 'title', 'director', 'cast', 'country', 'date_added',
+                         'release_year', 'rating', 'duration', 'listed_in', 'description'])
+        for i in range(rows):
+            writer.writerow([f"s{i}", 'Movie', f"{_phrase(rng, 3).title()} {i}",
+                             '' if i % 7 == 0 else f"Director {i % 1709}",
+                             ', '.join(f"Actor {rng.randint(0, 20000)}" for _ in range(4)), 'United States',
+                             'January 1, 2020', rng.randint(1950, 2021), rng.choice(MATURITY),
+                             f"{rng.randint(70, 180)} min", ', '.join(rng.sample(GENRES, 2)),
+                             f"A {_phrase(rng, 1)} story about {_phrase(rng, 6)}."])
+
+
+def write_book_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['book_id', 'goodreads_book_id', 'best_book_id', 'work_id', 'books_count', 'isbn',
+                         'isbn13', 'authors', 'original_publication_year', 'original_title', 'title',
+                         'language_code', 'average_rating'])
+        for i in range(rows):
+            title = f"{rng.choice(SERIES)} {i}" if i % 50 == 0 else f"{_phrase(rng, 3).title()} {i}"
+            rating = '' if i % 97 == 0 else round(rng.uniform(2.5, 5.0), 2)
+            writer.writerow([i + 1, 1000 + i, 1000 + i, 5000 + i, rng.randint(1, 200), f"{i:09d}X",
+                             "9.78E+12", f"Author {i % 4001}", '' if i % 31 == 0 else rng.randint(1800, 2017),
+                             title, title, 'eng', rating])
@@ -0,0 +1,535 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+# Bump when the on-disk layout written by Catalog.save changes
+SNAPSHOT_FORMAT = 1
+
+
+def stable_hash(value):
+    # Process-independent 64-bit hash (Python's hash() is salted per process)
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+class NumericColumn:
+    kind = 'numeric'
+
+    def __init__(self, values):
+        self.values = values
+
+    def arrays(self):
+        return {'values': self.values}
+
+    @classmethod
+    def from_arrays(cls, arrays, spec):
+        return cls(arrays['values'])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i].item()
+
+    def numeric(self):
+        return self.values.astype(float, copy=False)
+
+    def nbytes(self):
+        return self.values.nbytes
+
+
+class StringColumn:
+    # All strings of a column stored as one UTF-8 buffer plus offsets.
+    # Missing values are tracked in a mask and read back as NaN like pandas does.
+    kind = 'string'
+
+    def __init__(self, data, offsets, nulls=None, hash_order=None):
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+        self._hash_order = hash_order
+
+    def arrays(self):
+        arrays = {'data': self.data, 'offsets': self.offsets}
+        if self.nulls is not None:
+            arrays['nulls'] = self.nulls
+        if self._hash_order is not None:
+            arrays['hashes'], arrays['order'] = self._hash_order
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, spec):
+        hash_order = (arrays['hashes'], arrays['order']) if 'hashes' in arrays else None
+        return cls(arrays['data'], arrays['offsets'], arrays.get('nulls'), hash_order)
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = []
+        nulls = np.zeros(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            if value is None or (isinstance(value, float) and value != value):
+                nulls[i] = True
+                encoded.append(b'')
+            else:
+                encoded.append(str(value).encode('utf-8'))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets, nulls if nulls.any() else None)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return float('nan')
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def numeric(self):
+        return pd.to_numeric(pd.Series([self[i] for i in range(len(self))], dtype=object), errors='coerce').to_numpy(dtype=float)
+
+    def prepare_lookup(self):
+        # Sorted 64-bit hashes of every value, so lookups are binary searches
+        if self._hash_order is None:
+            hashes = np.array([stable_hash(self[i]) for i in range(len(self))], dtype=np.int64)
+            order = np.argsort(hashes, kind='stable')
+            self._hash_order = (hashes[order], order)
+        return self._hash_order
+
+    def lookup(self, values):
+        # Row indices whose value equals one of `values`
+        hashes, order = self.prepare_lookup()
+        values = list(values)
+        wanted = np.array([stable_hash(value) for value in values], dtype=np.int64)
+        starts = np.searchsorted(hashes, wanted, side='left')
+        ends = np.searchsorted(hashes, wanted, side='right')
+        rows = []
+        for value, start, end in zip(values, starts, ends):
+            rows.extend(int(row) for row in order[start:end] if self[row] == value)
+        return rows
+
+    def lookup_hashes(self, hashes):
+        # Row indices whose value hashes (stable_hash) to one of `hashes`
+        sorted_hashes, order = self.prepare_lookup()
+        wanted = np.asarray(hashes, dtype=np.int64)
+        starts = np.searchsorted(sorted_hashes, wanted, side='left')
+        lengths = np.searchsorted(sorted_hashes, wanted, side='right') - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.asarray(order)[positions]
+
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes + (self.nulls.nbytes if self.nulls is not None else 0)
+
+
+class CategoricalColumn:
+    kind = 'categorical'
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = list(categories)
+
+    def arrays(self):
+        return {'codes': self.codes}
+
+    def spec(self):
+        return {'categories': self.categories}
+
+    @classmethod
+    def from_arrays(cls, arrays, spec):
+        return cls(arrays['codes'], spec['categories'])
+
+    @classmethod
+    def from_values(cls, values):
+        cat = pd.Categorical(values)
+        codes = cat.codes.astype(np.int16 if len(cat.categories) > 127 else np.int8)
+        return cls(codes, [c.item() if hasattr(c, 'item') else c for c in cat.categories])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return float('nan') if code < 0 else self.categories[code]
+
+    def code_of(self, value):
+        return self.categories.index(value) if value in self.categories else -1
+
+    def numeric(self):
+        values = pd.to_numeric(pd.Series(self.categories, dtype=object), errors='coerce').to_numpy(dtype=float)
+        return np.where(self.codes >= 0, values[self.codes], np.nan)
+
+    def lookup(self, values):
+        rows = []
+        for value in values:
+            code = self.code_of(value)
+            if code >= 0:
+                rows.extend(np.flatnonzero(self.codes == code).tolist())
+        return rows
+
+    def nbytes(self):
+        return self.codes.nbytes
+
+
+class TemplateColumn:
+    # Column derived from another one, e.g. the placeholder book summaries
+    kind = 'template'
+
+    def __init__(self, template, source, source_name=None):
+        self.template = template
+        self.source = source
+        self.source_name = source_name
+
+    def arrays(self):
+        return {}
+
+    def spec(self):
+        return {'template': self.template, 'source': self.source_name}
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, i):
+        return self.template.format(self.source[i])
+
+    def nbytes(self):
+        return 0
+
+
+class Catalog:
+    # Column-oriented replacement for DataFrame.to_dict('records'). Rows are
+    # only turned into dicts when indexed, so a recommendation materializes the
+    # single item it returns.
+    def __init__(self, columns=None):
+        self.columns = dict(columns or {})
+        # Snapshot directory this catalog is memory-mapped from, if any
+        self.path = None
+        self._length = len(next(iter(self.columns.values()))) if self.columns else 0
+
+    @classmethod
+    def from_frame(cls, df, categorical=(), templates=None):
+        templates = templates or {}
+        columns = {}
+        for name in df.columns:
+            if name in templates:
+                template, source = templates[name]
+                columns[name] = TemplateColumn(template, columns[source], source)
+            elif name in categorical:
+                columns[name] = CategoricalColumn.from_values(df[name])
+            elif pd.api.types.is_numeric_dtype(df[name]) and not pd.api.types.is_bool_dtype(df[name]):
+                columns[name] = NumericColumn(df[name].to_numpy())
+            else:
+                columns[name] = StringColumn.from_values(df[name].tolist())
+        return cls(columns)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return {name: column[i] for name, column in self.columns.items()}
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self[i]
+
+    def column(self, name):
+        return self.columns[name]
+
+    def numeric(self, name):
+        if name not in self.columns:
+            return np.zeros(self._length)
+        return self.columns[name].numeric()
+
+    def lookup(self, name, values):
+        return self.columns[name].lookup(values)
+
+    def lookup_hashes(self, name, hashes):
+        return self.columns[name].lookup_hashes(hashes)
+
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns.values())
+
+    def save(self, directory):
+        # One .npy file per column array plus a meta.json describing the columns
+        os.makedirs(directory, exist_ok=True)
+        spec = []
+        for name, column in self.columns.items():
+            entry = {'name': name, 'kind': column.kind}
+            if hasattr(column, 'spec'):
+                entry.update(column.spec())
+            entry['arrays'] = []
+            for part, array in column.arrays().items():
+                np.save(os.path.join(directory, f"{name}.{part}.npy"), np.ascontiguousarray(array))
+                entry['arrays'].append(part)
+            spec.append(entry)
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'format': SNAPSHOT_FORMAT, 'length': self._length, 'columns': spec}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        # Arrays are memory-mapped read-only by default, so every worker that
+        # loads the same snapshot shares its pages through the OS page cache
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported catalog snapshot format: {meta.get('format')}")
+        kinds = {c.kind: c for c in (NumericColumn, StringColumn, CategoricalColumn)}
+        columns = {}
+        for entry in meta['columns']:
+            name = entry['name']
+            if entry['kind'] == 'template':
+                columns[name] = TemplateColumn(entry['template'], columns[entry['source']], entry['source'])
+                continue
+            arrays = {part: np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode=mmap_mode)
+                      for part in entry['arrays']}
+            columns[name] = kinds[entry['kind']].from_arrays(arrays, entry)
+        catalog = cls(columns)
+        catalog.path = directory
+        return catalog
+
+
+# Bytes copied per step when assembling snapshot arrays
+COPY_BLOCK = 1 << 24
+
+
+def _sorted_categories(categories):
+    # The order pd.Categorical would give, so chunked and whole-frame builds agree
+    try:
+        return sorted(categories)
+    except TypeError:
+        return list(categories)
+
+
+class _PartFile:
+    # Raw, growing array file for one column part; turned into a .npy at the end
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.file = open(path, 'wb')
+
+    def write(self, array):
+        array = np.ascontiguousarray(array, dtype=self.dtype)
+        self.file.write(array.tobytes())
+        self.length += len(array)
+
+    def write_from(self, array):
+        # Copies an existing (possibly memory-mapped) array block by block
+        step = max(1, COPY_BLOCK // max(1, self.dtype.itemsize))
+        for start in range(0, len(array), step):
+            self.write(array[start:start + step])
+
+    def promote(self, dtype):
+        # Rewrites what was written so far as `dtype`, e.g. ints that turn
+        # out to have missing values in a later chunk
+        dtype = np.dtype(dtype)
+        self.file.close()
+        old = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(self.length,)) if self.length else np.empty(0, self.dtype)
+        tmp_path = self.path + '.promote'
+        with open(tmp_path, 'wb') as f:
+            step = max(1, COPY_BLOCK // dtype.itemsize)
+            for start in range(0, self.length, step):
+                f.write(np.ascontiguousarray(old[start:start + step], dtype=dtype).tobytes())
+        del old
+        os.replace(tmp_path, self.path)
+        self.dtype = dtype
+        self.file = open(self.path, 'ab')
+
+    def finish(self, npy_path, dtype=None, convert=None):
+        # Writes the .npy through a memmap so only one block is in memory
+        self.file.close()
+        dtype = np.dtype(dtype or self.dtype)
+        target = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=(self.length,))
+        if self.length:
+            source = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(self.length,))
+            step = max(1, COPY_BLOCK // self.dtype.itemsize)
+            for start in range(0, self.length, step):
+                block = source[start:start + step]
+                target[start:start + step] = convert(block) if convert else block
+            del source
+        target.flush()
+        del target
+        os.remove(self.path)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CatalogWriter:
+    # Builds a snapshot directory (the same layout as Catalog.save) from
+    # DataFrame chunks, so a catalog never has to fit in memory as a frame:
+    # each chunk is encoded like Catalog.from_frame and its arrays are
+    # appended to files in the directory. Category codes are remapped to one
+    # category list, string offsets are rebased, and value hashes for the
+    # `lookup` columns are collected as rows arrive. close() writes the .npy
+    # files and meta.json and returns the memory-mapped Catalog.
+    def __init__(self, directory, categorical=(), templates=None, lookup=()):
+        self.directory = directory
+        self.categorical = tuple(categorical)
+        self.templates = dict(templates or {})
+        self.lookup = tuple(lookup)
+        self.length = 0
+        self.kinds = None
+        self.parts = {}
+        self.categories = {}
+        self.string_bytes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _part(self, name, part, dtype):
+        key = (name, part)
+        if key not in self.parts:
+            self.parts[key] = _PartFile(os.path.join(self.directory, f"{name}.{part}.bin"), dtype)
+        return self.parts[key]
+
+    def _start(self, columns):
+        self.kinds = {name: column.kind for name, column in columns.items()}
+        for name, column in columns.items():
+            if column.kind == 'numeric':
+                self._part(name, 'values', column.values.dtype)
+            elif column.kind == 'string':
+                self._part(name, 'offsets', np.int64).write(np.zeros(1, dtype=np.int64))
+                self._part(name, 'data', np.uint8)
+                self._part(name, 'nulls', bool)
+                self.string_bytes[name] = 0
+                if name in self.lookup:
+                    self._part(name, 'rowhash', np.int64)
+            elif column.kind == 'categorical':
+                self.categories[name] = {}
+                self._part(name, 'codes', np.int32)
+            elif column.kind == 'template':
+                self.templates.setdefault(name, (column.template, column.source_name))
+
+    def _conform(self, df):
+        # Later chunks are coerced to the column kinds of the first one
+        df = df.copy()
+        for name, kind in self.kinds.items():
+            numeric = pd.api.types.is_numeric_dtype(df[name]) and not pd.api.types.is_bool_dtype(df[name])
+            if kind == 'numeric' and not numeric:
+                df[name] = pd.to_numeric(df[name], errors='coerce')
+            elif kind == 'string' and numeric:
+                df[name] = df[name].astype(object)
+        return df
+
+    def append(self, df):
+        if self.kinds is None:
+            self._start(Catalog.from_frame(df.iloc[:0], self.categorical, self.templates).columns)
+        elif list(df.columns) != list(self.kinds):
+            raise ValueError(f"Chunk columns {list(df.columns)} do not match {list(self.kinds)}")
+        else:
+            df = self._conform(df)
+        if not len(df):
+            return
+        chunk = Catalog.from_frame(df, self.categorical, self.templates)
+        for name, column in chunk.columns.items():
+            kind = self.kinds[name]
+            if kind == 'numeric':
+                part = self.parts[(name, 'values')]
+                dtype = np.result_type(part.dtype, column.values.dtype)
+                if dtype != part.dtype:
+                    part.promote(dtype)
+                part.write(column.values)
+            elif kind == 'string':
+                self._part(name, 'offsets', np.int64).write(column.offsets[1:] + self.string_bytes[name])
+                self._part(name, 'data', np.uint8).write(column.data)
+                self.string_bytes[name] += len(column.data)
+                nulls = column.nulls if column.nulls is not None else np.zeros(len(column), dtype=bool)
+                self._part(name, 'nulls', bool).write(nulls)
+                if name in self.lookup:
+                    self._part(name, 'rowhash', np.int64).write(
+                        np.array([stable_hash(column[i]) for i in range(len(column))], dtype=np.int64))
+            elif kind == 'categorical':
+                codes = self.categories[name]
+                remap = np.array([codes.setdefault(value, len(codes)) for value in column.categories] + [-1], dtype=np.int32)
+                self._part(name, 'codes', np.int32).write(remap[column.codes])
+        self.length += len(df)
+
+    @classmethod
+    def resume(cls, snapshot_dir, directory, categorical=(), templates=None, lookup=()):
+        # A writer that starts with the rows of an existing snapshot, for
+        # appending new source rows without re-reading the old ones
+        catalog = Catalog.load(snapshot_dir)
+        writer = cls(directory, categorical, templates, lookup)
+        writer._start(catalog.columns)
+        for name, column in catalog.columns.items():
+            if column.kind == 'numeric':
+                writer.parts[(name, 'values')].write_from(column.values)
+            elif column.kind == 'string':
+                writer._part(name, 'offsets', np.int64).write_from(column.offsets[1:])
+                writer._part(name, 'data', np.uint8).write_from(column.data)
+                writer.string_bytes[name] = int(column.offsets[-1])
+                nulls = writer._part(name, 'nulls', bool)
+                if column.nulls is not None:
+                    nulls.write_from(column.nulls)
+                else:
+                    nulls.write_from(np.zeros(len(column), dtype=bool))
+                if name in writer.lookup:
+                    hashes, order = column.prepare_lookup()
+                    rowhash = np.empty(len(column), dtype=np.int64)
+                    rowhash[np.asarray(order)] = hashes
+                    writer._part(name, 'rowhash', np.int64).write(rowhash)
+            elif column.kind == 'categorical':
+                writer.categories[name] = {value: code for code, value in enumerate(column.categories)}
+                writer._part(name, 'codes', np.int32).write_from(column.codes)
+        writer.length = len(catalog)
+        return writer
+
+    def close(self):
+        spec = []
+        for name, kind in (self.kinds or {}).items():
+            entry = {'name': name, 'kind': kind, 'arrays': []}
+            path = lambda part: os.path.join(self.directory, f"{name}.{part}.npy")
+            if kind == 'template':
+                template, source = self.templates[name]
+                entry.update(template=template, source=source)
+            elif kind == 'numeric':
+                self.parts[(name, 'values')].finish(path('values'))
+                entry['arrays'].append('values')
+            elif kind == 'string':
+                for part in ('data', 'offsets'):
+                    self.parts[(name, part)].finish(path(part))
+                    entry['arrays'].append(part)
+                nulls = self.parts[(name, 'nulls')]
+                nulls.file.close()
+                if nulls.length and np.fromfile(nulls.path, dtype=bool).any():
+                    nulls.finish(path('nulls'))
+                    entry['arrays'].append('nulls')
+                else:
+                    nulls.discard()
+                if name in self.lookup:
+                    rowhash = self.parts[(name, 'rowhash')]
+                    rowhash.file.close()
+                    hashes = np.fromfile(rowhash.path, dtype=np.int64)
+                    order = np.argsort(hashes, kind='stable')
+                    np.save(path('hashes'), hashes[order])
+                    np.save(path('order'), order)
+                    rowhash.discard()
+                    entry['arrays'] += ['hashes', 'order']
+            elif kind == 'categorical':
+                # Sorted categories and the smallest code type, as from_values does
+                codes = self.categories[name]
+                categories = _sorted_categories(codes)
+                remap = np.zeros(len(codes) + 1, dtype=np.int32)
+                for value, code in codes.items():
+                    remap[code] = categories.index(value)
+                remap[-1] = -1
+                dtype = np.int16 if len(categories) > 127 else np.int8
+                self.parts[(name, 'codes')].finish(path('codes'), dtype, lambda block: remap[block].astype(dtype))
+                entry['categories'] = categories
+                entry['arrays'].append('codes')
+            spec.append(entry)
+        with open(os.path.join(self.directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'format': SNAPSHOT_FORMAT, 'length': self.length, 'columns': spec}, f)
+        self.parts = {}
+        return Catalog.load(self.directory)
+
+    def abort(self):
+        for part in self.parts.values():
+            part.discard()
+        self.parts = {}
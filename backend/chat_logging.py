@@ -0,0 +1,56 @@
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Per-request messages go to this logger; they are sampled, while warnings
+# and errors from anywhere are always kept
+CHAT_LOGGER = 'recobuddy.chat'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_sample_rate = 1.0
+# Whether the current request was picked for logging; set per request so all
+# of a request's lines are kept or dropped together
+_request_sampled = contextvars.ContextVar('request_sampled', default=True)
+
+
+class SamplingFilter(logging.Filter):
+    # Drops records below WARNING of requests that were not sampled
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or _request_sampled.get()
+
+
+def sample_request():
+    # Call at the start of a request; keeps a CHAT_LOG_SAMPLE_RATE fraction
+    _request_sampled.set(_sample_rate >= 1 or random.random() < _sample_rate)
+
+
+def configure_logging(level=None, sample_rate=None):
+    # Route all logging through a queue so request threads never block on
+    # the stream; a background listener thread does the writes. Idempotent.
+    global _listener, _sample_rate
+    if _listener is not None:
+        return
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    _sample_rate = float(os.environ.get('CHAT_LOG_SAMPLE_RATE', 1.0) if sample_rate is None else sample_rate)
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    logging.getLogger(CHAT_LOGGER).addFilter(SamplingFilter())
+
+
+chat_log = logging.getLogger(CHAT_LOGGER)
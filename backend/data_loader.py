@@ -1,118 +1,279 @@
 import pandas as pd
+import numpy as np
+import csv
+import hashlib
+import json
 import logging
+import os
+import shutil
+import tempfile
+from catalog import Catalog, CatalogWriter, SNAPSHOT_FORMAT
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_music_data(file_path='spotify_tracks.csv'):
+BOOK_SUMMARY_TEMPLATE = "A story about {}. (Summary not available in dataset.)"
+
+# Catalogs are read in chunks of this many CSV rows, keeping only the
+# columns they use, so memory stays bounded however large the CSVs get
+CHUNK_ROWS = int(os.environ.get('CATALOG_CHUNK_ROWS', 50000))
+
+def prepare_music_chunk(df):
+    # Map valence to emotions (0-0.3: sad, 0.3-0.7: neutral, 0.7-1.0: happy)
+    valence = df['valence']
+    df['emotion'] = np.where(valence < 0.3, 'sad', np.where(valence > 0.7, 'happy', 'neutral'))
+    return df[['track_number', 'name', 'artists', 'emotion', 'danceability', 'energy', 'year', 'release_date']]
+
+def prepare_movie_chunk(df):
+    # Infer emotions based on listed_in genres
+    genres = df['listed_in'].str.lower()
+    df['emotion'] = np.where(genres.str.contains('comedy|romance', na=False), 'happy',
+                             np.where(genres.str.contains('drama|documentary', na=False), 'sad', 'neutral'))
+    return df[['title', 'director', 'cast', 'listed_in', 'description', 'emotion', 'release_year', 'rating']]
+
+def book_category(title):
+    # Infer Category based on title (simplified heuristic)
+    return "['Young Adult', 'Dystopia']" if 'Hunger Games' in title else \
+           "['Fantasy']" if 'Harry Potter' in title else \
+           "['Young Adult', 'Romance']" if 'Twilight' in title or 'Fault in Our Stars' in title else \
+           "['Classics', 'Fiction']" if 'To Kill a Mockingbird' in title or 'Great Gatsby' in title else \
+           "['Fantasy', 'Adventure']" if 'Hobbit' in title else \
+           "['Fiction']"
+
+def category_emotion(category):
+    # Infer emotions based on inferred category
+    category = category.lower()
+    return 'happy' if any(g in category for g in ['comedy', 'romance']) else \
+           'sad' if any(g in category for g in ['drama', 'tragedy']) else \
+           'neutral'
+
+def prepare_book_chunk(df):
+    missing_title = int(df['title'].isna().sum())
+    if missing_title:
+        logging.warning(f"Found {missing_title} rows with missing title")
+
+    # Drop rows where critical columns are NaN or the string 'nan', and
+    # ratings outside the valid range (0 to 5)
+    keep = df['title'].notna() & df['authors'].notna() & df['average_rating'].notna()
+    keep &= (df['title'].str.lower() != 'nan') & (df['authors'].str.lower() != 'nan')
+    keep &= df['average_rating'].between(0, 5)
+    df = df[keep]
+
+    # Map the source columns to the expected fields without copying them
+    category = df['title'].map(book_category)
+    return pd.DataFrame({
+        'book_title': df['title'],
+        'book_author': df['authors'],
+        'Category': category,
+        # The summary is derived from the title on access instead of being stored per row
+        'Summary': '',
+        'emotion': category.map(category_emotion),
+        'year_of_publication': df['original_publication_year'].fillna(0).astype(int),
+        'rating': df['average_rating'],
+    }, index=df.index)
+
+# Per catalog: the CSV columns read, their dtypes, the per-chunk cleaning and
+# labeling, and how the result is stored
+CATALOG_SOURCES = {
+    'music': {
+        'usecols': ['track_number', 'name', 'artists', 'valence', 'danceability', 'energy', 'year', 'release_date'],
+        'dtype': {'name': str, 'artists': str, 'release_date': str, 'valence': float, 'danceability': float, 'energy': float},
+        'prepare': prepare_music_chunk,
+        'categorical': ('emotion',),
+        'templates': None,
+        'title': 'name',
+    },
+    'movie': {
+        'usecols': ['title', 'director', 'cast', 'listed_in', 'description', 'release_year', 'rating'],
+        'dtype': {'title': str, 'director': str, 'cast': str, 'listed_in': str, 'description': str, 'rating': str},
+        'prepare': prepare_movie_chunk,
+        'categorical': ('emotion', 'rating'),
+        'templates': None,
+        'title': 'title',
+    },
+    'book': {
+        'usecols': ['title', 'authors', 'original_publication_year', 'average_rating'],
+        # original_publication_year is a float to allow NaN
+        'dtype': {'title': str, 'authors': str, 'original_publication_year': float, 'average_rating': float},
+        'na_values': ['nan', 'NaN', ''],
+        'prepare': prepare_book_chunk,
+        'categorical': ('Category', 'emotion'),
+        'templates': {'Summary': (BOOK_SUMMARY_TEMPLATE, 'book_title')},
+        'title': 'book_title',
+    },
+}
+
+def read_chunks(name, file_path, offset=0):
+    # Cleaned, labeled chunks of a catalog CSV. With an offset only the rows
+    # from that byte position on are read (the header still comes from the
+    # first line), for rows appended since the last build.
+    source = CATALOG_SOURCES[name]
+    options = {'usecols': source['usecols'], 'dtype': source['dtype'], 'chunksize': CHUNK_ROWS}
+    if 'na_values' in source:
+        options.update(na_values=source['na_values'], keep_default_na=True)
+    with open(file_path, 'rb') as f:
+        if offset:
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]))
+            f.seek(offset)
+            options.update(header=None, names=header)
+        for chunk in pd.read_csv(f, encoding='utf-8', **options):
+            yield source['prepare'](chunk)
+
+def load_catalog_data(name, file_path):
+    # The whole catalog in memory, without a snapshot
+    source = CATALOG_SOURCES[name]
     try:
-        df = pd.read_csv(file_path)
-        # Map valence to emotions (0-0.3: sad, 0.3-0.7: neutral, 0.7-1.0: happy)
-        df['emotion'] = df['valence'].apply(
-            lambda x: 'sad' if x < 0.3 else 'happy' if x > 0.7 else 'neutral'
-        )
-        return df[['track_number', 'name', 'artists', 'emotion', 'danceability', 'energy', 'year', 'release_date']].to_dict('records')
+        chunks = list(read_chunks(name, file_path))
+        if not chunks:
+            return Catalog()
+        df = pd.concat(chunks, ignore_index=True)
+        logging.info(f"Loaded {name} catalog from {file_path}: {len(df)} rows")
+        return Catalog.from_frame(df, categorical=source['categorical'], templates=source['templates'])
     except Exception as e:
-        logging.error(f"Error loading music data: {e}")
-        return []
+        logging.error(f"Error loading {name} data: {e}")
+        return Catalog()
+
+def load_music_data(file_path='spotify_tracks.csv'):
+    return load_catalog_data('music', file_path)
 
 def load_movie_data(file_path='netflix_movies.csv'):
-    try:
-        df = pd.read_csv(file_path)
-        # Infer emotions based on listed_in genres
-        df['emotion'] = df['listed_in'].apply(
-            lambda x: 'happy' if any(g in x.lower() for g in ['comedy', 'romance']) else
-                      'sad' if any(g in x.lower() for g in ['drama', 'documentary']) else
-                      'neutral'
-        )
-        return df[['title', 'director', 'cast', 'listed_in', 'description', 'emotion', 'release_year', 'rating']].to_dict('records')
-    except Exception as e:
-        logging.error(f"Error loading movie data: {e}")
-        return []
+    return load_catalog_data('movie', file_path)
 
 def load_book_data(file_path='books.csv'):
+    return load_catalog_data('book', file_path)
+
+# Catalog snapshots: cleaned, emotion-labeled catalogs written once as .npy
+# files and memory-mapped by every worker afterwards. They are built by
+# streaming the CSV chunks straight into the snapshot files; when rows were
+# only appended to a CSV, the new snapshot starts from the old one and just
+# the new rows are read.
+SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR', 'catalog_snapshots')
+
+def file_sha256(file_path):
+    return file_digests(file_path, 0)[1]
+
+def file_digests(file_path, prefix_size):
+    # In one pass: sha256 of the first prefix_size bytes, sha256 of the whole
+    # file, and whether the prefix ends with a line break
+    prefix, digest = hashlib.sha256(), hashlib.sha256()
+    prefix_hex, last_byte, position = None, b'', 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            if prefix_hex is None and position + len(block) >= prefix_size:
+                head = block[:prefix_size - position]
+                prefix.update(head)
+                prefix_hex = prefix.hexdigest()
+                last_byte = head[-1:] if head else last_byte
+            elif prefix_hex is None:
+                prefix.update(block)
+                last_byte = block[-1:]
+            digest.update(block)
+            position += len(block)
+    if prefix_hex is None:
+        prefix_hex = prefix.hexdigest() if position == prefix_size else None
+    return prefix_hex, digest.hexdigest(), last_byte == b'\n'
+
+def _read_snapshot_index(index_path):
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_snapshot_index(index_path, entry):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, index_path)
+
+def build_snapshot(name, file_path, snapshot_dir=SNAPSHOT_DIR, source_hash=None, append_from=None):
+    # append_from=(snapshot path, byte offset) copies that snapshot and only
+    # reads the CSV rows after the offset
+    source = CATALOG_SOURCES[name]
+    source_hash = source_hash or file_sha256(file_path)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=snapshot_dir, prefix=f".{name}-")
+    options = {'categorical': source['categorical'], 'templates': source['templates'], 'lookup': (source['title'],)}
+    writer = None
     try:
-        # Define expected data types for each column
-        dtypes = {
-            'book_id': int,
-            'goodreads_book_id': int,
-            'best_book_id': int,
-            'work_id': int,
-            'books_count': int,
-            'isbn': str,
-            'isbn13': str,  # ISBN13 might be in scientific notation (e.g., 9.78E+12), treat as string
-            'authors': str,
-            'original_publication_year': float,  # Use float to handle NaN
-            'original_title': str,
-            'title': str,
-            'language_code': str,
-            'average_rating': float
-        }
-        
-        # Load the CSV with specified dtypes and handle missing values
-        df = pd.read_csv(
-            file_path,
-            dtype=dtypes,
-            na_values=['nan', 'NaN', ''],  # Treat these as missing values
-            keep_default_na=True
-        )
-        
-        # Log the initial shape of the DataFrame
-        logging.info(f"Loaded books.csv with shape: {df.shape}")
-        
-        # Log rows with missing critical values before dropping
-        missing_title = df[df['title'].isna()]
-        if not missing_title.empty:
-            logging.warning(f"Found {len(missing_title)} rows with missing title: {missing_title.to_dict('records')}")
-        
-        # Drop rows where critical columns are NaN
-        df = df.dropna(subset=['title', 'authors', 'average_rating'])
-        
-        # Additional filter to remove 'nan' strings
-        df = df[df['title'].str.lower() != 'nan']
-        df = df[df['authors'].str.lower() != 'nan']
-        
-        # Ensure average_rating is numeric and within a valid range (0 to 5)
-        df['average_rating'] = pd.to_numeric(df['average_rating'], errors='coerce')
-        df = df.dropna(subset=['average_rating'])
-        df = df[(df['average_rating'] >= 0) & (df['average_rating'] <= 5)]
-        
-        # Map new columns to expected fields
-        df['book_title'] = df['title']
-        df['book_author'] = df['authors']
-        df['year_of_publication'] = df['original_publication_year'].fillna(0).astype(int)
-        df['rating'] = df['average_rating']
-        
-        # Infer Category based on title (simplified heuristic)
-        df['Category'] = df['title'].apply(
-            lambda x: "['Young Adult', 'Dystopia']" if 'Hunger Games' in x else
-                      "['Fantasy']" if 'Harry Potter' in x else
-                      "['Young Adult', 'Romance']" if 'Twilight' in x or 'Fault in Our Stars' in x else
-                      "['Classics', 'Fiction']" if 'To Kill a Mockingbird' in x or 'Great Gatsby' in x else
-                      "['Fantasy', 'Adventure']" if 'Hobbit' in x else
-                      "['Fiction']"
-        )
-        
-        # Infer emotions based on inferred category
-        df['emotion'] = df['Category'].apply(
-            lambda x: 'happy' if any(g in x.lower() for g in ['comedy', 'romance']) else
-                      'sad' if any(g in x.lower() for g in ['drama', 'tragedy']) else
-                      'neutral'
-        )
-        
-        # Add a default Summary (since it's not in the new dataset)
-        df['Summary'] = df['title'].apply(lambda x: f"A story about {x}. (Summary not available in dataset.)")
-        
-        # Log the final shape after cleaning
-        logging.info(f"Books data after cleaning: {df.shape}")
-        
-        return df[['book_title', 'book_author', 'Category', 'Summary', 'emotion', 'year_of_publication', 'rating']].to_dict('records')
+        if append_from:
+            writer = CatalogWriter.resume(append_from[0], tmp_dir, **options)
+        else:
+            writer = CatalogWriter(tmp_dir, **options)
+        previous = writer.length
+        for chunk in read_chunks(name, file_path, append_from[1] if append_from else 0):
+            writer.append(chunk)
+        length = len(writer.close())
     except Exception as e:
-        logging.error(f"Error loading book data: {e}")
-        return []
+        if writer is not None:
+            writer.abort()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        logging.error(f"Error loading {name} data: {e}")
+        return Catalog()
+    if not length:
+        # Don't persist an empty catalog
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return Catalog()
+
+    target = os.path.join(snapshot_dir, f"{name}-{source_hash[:16]}")
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Another worker published the same snapshot first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    stat = os.stat(file_path)
+    _write_snapshot_index(os.path.join(snapshot_dir, f"{name}.json"), {
+        'format': SNAPSHOT_FORMAT,
+        'source': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': source_hash,
+        'snapshot': os.path.basename(target),
+    })
+    for entry in os.listdir(snapshot_dir):
+        if entry.startswith(f"{name}-") and entry != os.path.basename(target):
+            shutil.rmtree(os.path.join(snapshot_dir, entry), ignore_errors=True)
+    if append_from:
+        logging.info(f"Appended {length - previous} rows to {name} catalog snapshot {target} ({length} rows)")
+    else:
+        logging.info(f"Built {name} catalog snapshot {target} ({length} rows)")
+    return Catalog.load(target)
+
+def load_catalog(name, file_path, snapshot_dir=SNAPSHOT_DIR):
+    # Memory-map the snapshot for this CSV, rebuilding it when the CSV changed.
+    # Size and mtime are checked first so an unchanged file is not re-hashed.
+    index = _read_snapshot_index(os.path.join(snapshot_dir, f"{name}.json"))
+    if index and index.get('format') != SNAPSHOT_FORMAT:
+        index = None
+    snapshot_path = os.path.join(snapshot_dir, index['snapshot']) if index else None
+
+    if not os.path.exists(file_path):
+        if snapshot_path and os.path.isdir(snapshot_path):
+            logging.warning(f"{file_path} not found, using catalog snapshot {snapshot_path}")
+            return Catalog.load(snapshot_path)
+        return load_catalog_data(name, file_path)
+
+    stat = os.stat(file_path)
+    if index and os.path.isdir(snapshot_path):
+        if index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns:
+            return Catalog.load(snapshot_path)
+        prefix_hash, source_hash, line_end = file_digests(file_path, index['size'])
+        if index['sha256'] == source_hash:
+            # Touched but unchanged; refresh the cheap check for next time
+            _write_snapshot_index(os.path.join(snapshot_dir, f"{name}.json"),
+                                  dict(index, size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+            return Catalog.load(snapshot_path)
+        if index['sha256'] == prefix_hash and line_end:
+            logging.info(f"{file_path} has new rows, appending them to the {name} catalog snapshot")
+            return build_snapshot(name, file_path, snapshot_dir, source_hash, append_from=(snapshot_path, index['size']))
+        logging.info(f"{file_path} changed, rebuilding {name} catalog snapshot")
+        return build_snapshot(name, file_path, snapshot_dir, source_hash)
+    return build_snapshot(name, file_path, snapshot_dir)
 
 if __name__ == "__main__":
-    music = load_music_data()
-    movies = load_movie_data()
-    books = load_book_data()
+    # Also builds or refreshes the catalog snapshots
+    music = load_catalog('music', 'spotify_tracks.csv')
+    movies = load_catalog('movie', 'netflix_movies.csv')
+    books = load_catalog('book', 'books.csv')
     print(f"Loaded {len(music)} music tracks, {len(movies)} movies, {len(books)} books")
\ No newline at end of file
@@ -0,0 +1,101 @@
+import numpy as np
+from collections import OrderedDict
+from catalog import stable_hash
+
+# Per-user exclusion state, stored in the user document as
+#   exclusions: {'version': 1,
+#                'seen': {'book': <bytes>, 'movie': <bytes>, 'music': <bytes>},
+#                'disliked': <bytes>}
+# Each bytes value is a packed array of 64-bit item ids (stable hashes of the
+# item title, the same hashes the catalog title lookup is sorted by).
+EXCLUSIONS_VERSION = 1
+SEEN_WINDOW = 500
+MAX_DISLIKED = 10000
+
+
+def item_id(title):
+    return stable_hash(title)
+
+
+class IdWindow:
+    # Insertion-ordered set of item ids holding at most `capacity` ids; adding
+    # to a full window forgets the oldest id. Membership is a dict lookup.
+    def __init__(self, ids=(), capacity=SEEN_WINDOW):
+        self.capacity = capacity
+        self.ids = OrderedDict()
+        for value in ids:
+            self.add(value)
+
+    def add(self, value):
+        value = int(value)
+        if value in self.ids:
+            return
+        self.ids[value] = None
+        while len(self.ids) > self.capacity:
+            self.ids.popitem(last=False)
+
+    def __contains__(self, value):
+        return int(value) in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def truncate(self, count):
+        # Keep only the `count` most recently added ids
+        while len(self.ids) > count:
+            self.ids.popitem(last=False)
+
+    def to_bytes(self):
+        return np.fromiter(self.ids, dtype='<i8', count=len(self.ids)).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, capacity=SEEN_WINDOW):
+        return cls(np.frombuffer(data or b'', dtype='<i8').tolist(), capacity)
+
+
+def empty_exclusions():
+    return {'version': EXCLUSIONS_VERSION, 'seen': {}, 'disliked': b''}
+
+
+class UserExclusions:
+    # Decoded view of user_data['exclusions']; write changes back with save()
+    def __init__(self, user_data):
+        self.user_data = user_data
+        stored = user_data.get('exclusions') or empty_exclusions()
+        self.seen = {category: IdWindow.from_bytes(data) for category, data in stored.get('seen', {}).items()}
+        self.disliked = IdWindow.from_bytes(stored.get('disliked'), MAX_DISLIKED)
+
+    def seen_window(self, category):
+        return self.seen.setdefault(category, IdWindow())
+
+    def mark_seen(self, category, title):
+        self.seen_window(category).add(item_id(title))
+
+    def dislike(self, title):
+        self.disliked.add(item_id(title))
+
+    def save(self):
+        self.user_data['exclusions'] = {
+            'version': EXCLUSIONS_VERSION,
+            'seen': {category: window.to_bytes() for category, window in self.seen.items()},
+            'disliked': self.disliked.to_bytes(),
+        }
+
+
+def migrate_user_data(user_data):
+    # Turns the old title lists (previously_recommended.{category} and
+    # preferences.disliked) into id windows. Returns True when the document
+    # changed; the old fields are removed.
+    if 'previously_recommended' not in user_data and 'disliked' not in user_data.get('preferences', {}):
+        return False
+    exclusions = UserExclusions(user_data)
+    for category, titles in (user_data.pop('previously_recommended', None) or {}).items():
+        for title in titles[-SEEN_WINDOW:]:
+            exclusions.mark_seen(category, title)
+    for title in user_data.get('preferences', {}).pop('disliked', None) or []:
+        exclusions.dislike(title)
+    exclusions.save()
+    return True
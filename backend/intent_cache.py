@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Bumped when the meaning of the saved entries changes; older files are ignored
+CACHE_FORMAT = 2
+
+
+def normalize_message(message):
+    # Lowercase, turn punctuation/symbol runs into spaces and collapse
+    # whitespace, so "Hello!!" and "hello" share an entry
+    text = ''.join(' ' if unicodedata.category(c)[0] in 'PS' else c for c in message.lower())
+    return ' '.join(text.split())
+
+
+class IntentCache:
+    # LRU cache of the intent model's label per normalized message, with an
+    # optional TTL and an optional JSON file to keep the warm set across restarts.
+    # The labels are raw model output: the keyword rules are applied after
+    # every lookup, so keywords.json edits take effect on cached messages.
+    # Mood and tone are not cached: VADER scores the punctuation and emoticons
+    # the normalization strips ("great :)" vs "great :("), and it is cheap.
+    def __init__(self, max_size=10000, ttl=None, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self.load()
+
+    def get(self, message):
+        key = normalize_message(message)
+        with self.lock:
+            entry = self.entries.get(key)
+            # Entries saved without a TTL have no expiry and never expire
+            if entry is not None and entry['expires'] is not None and entry['expires'] < time.time():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['label']
+
+    def put(self, message, label):
+        key = normalize_message(message)
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = {'label': label, 'expires': expires}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable intent cache {self.path}: {e}")
+            return
+        if saved.get('format') != CACHE_FORMAT:
+            # Older files hold intents with the keyword rules already applied
+            logging.info(f"Ignoring intent cache {self.path} in an older format")
+            return
+        now = time.time()
+        with self.lock:
+            # Saved oldest first, so replaying keeps the LRU order
+            for key, entry in saved.get('entries', []):
+                if entry['expires'] is None or entry['expires'] >= now:
+                    self.entries[key] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            snapshot = {'format': CACHE_FORMAT, 'entries': list(self.entries.items())}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
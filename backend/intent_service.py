@@ -0,0 +1,345 @@
+import argparse
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from intent_cache import normalize_message
+from keyword_matcher import KeywordRules
+
+CANDIDATE_LABELS = ['greeting', 'feedback', 'question', 'statement', 'complex_query', 'recommendation']
+# Intent classifier backends and their default models:
+#   bart       zero-shot facebook/bart-large-mnli (the reference)
+#   bart-int8  the same model with its Linear layers dynamically quantized to int8
+#   distilled  a distilled BART MNLI model, zero-shot like bart
+#   tfidf      TF-IDF + logistic regression trained on logged queries (intent_training.py)
+INTENT_BACKENDS = {
+    'bart': 'facebook/bart-large-mnli',
+    'bart-int8': 'facebook/bart-large-mnli',
+    'distilled': 'valhalla/distilbart-mnli-12-1',
+    'tfidf': 'intent_classifier.joblib',
+}
+TFIDF_MODEL_FORMAT = 1
+_keyword_rules = None
+
+
+def has_recommendation_keyword(message):
+    # The recommendation keywords of keywords.json, the same rules (and hot
+    # reload) as the chat server; read on first use
+    global _keyword_rules
+    if _keyword_rules is None:
+        _keyword_rules = KeywordRules()
+    return 'recommendation' in _keyword_rules.scan(message)
+
+
+def rule_based_intent(message, is_recommendation=has_recommendation_keyword):
+    # The keyword override always wins, so the model isn't needed
+    if is_recommendation(message):
+        return 'recommendation'
+    return None
+
+
+def apply_intent_rules(message, intent, is_recommendation=has_recommendation_keyword):
+    # Override intent for recommendation requests
+    if is_recommendation(message):
+        intent = 'recommendation'
+    # Override intent for complex queries
+    if intent not in ['greeting', 'recommendation'] and len(message.split()) > 5:
+        intent = 'complex_query'
+    return intent
+
+
+class BatchingClassifier:
+    # Collects concurrent classify() calls and runs them through the
+    # zero-shot pipeline as one batch. A batch is sent when it reaches
+    # max_batch messages or when the oldest message has waited max_wait.
+    # classify_async() waits on an event loop instead of a thread, so an
+    # ASGI server can keep a full batch of messages pending.
+    def __init__(self, pipeline, max_batch=16, max_wait=0.01):
+        self.pipeline = pipeline
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.worker = threading.Thread(target=self._run, name='intent-batcher', daemon=True)
+        self.worker.start()
+
+    def submit(self, message, callback=None):
+        # callback(slot) runs on the batch thread once the label is in
+        slot = {'message': message, 'done': threading.Event(), 'callback': callback}
+        self.pending.put(slot)
+        return slot
+
+    def wait(self, slot, timeout=None):
+        if not slot['done'].wait(timeout):
+            raise TimeoutError('Intent classification timed out')
+        if 'error' in slot:
+            raise slot['error']
+        return slot['label']
+
+    def classify(self, message, timeout=None):
+        return self.wait(self.submit(message), timeout)
+
+    def classify_many(self, messages, timeout=None):
+        slots = [self.submit(message) for message in messages]
+        return [self.wait(slot, timeout) for slot in slots]
+
+    async def classify_async(self, message, timeout=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.submit(message, lambda slot: loop.call_soon_threadsafe(_resolve, future, slot))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError('Intent classification timed out') from None
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                labels = self.predict([slot['message'] for slot in batch])
+                for slot, label in zip(batch, labels):
+                    slot['label'] = label
+            except Exception as e:
+                logging.error(f"Intent batch failed: {e}")
+                for slot in batch:
+                    slot['error'] = e
+            self.batches += 1
+            for slot in batch:
+                slot['done'].set()
+                if slot['callback'] is not None:
+                    try:
+                        slot['callback'](slot)
+                    except RuntimeError:
+                        # The waiting event loop is already closed
+                        pass
+
+    def predict(self, messages):
+        results = self.pipeline(messages, CANDIDATE_LABELS, multi_label=False, batch_size=len(messages))
+        if isinstance(results, dict):
+            results = [results]
+        return [result['labels'][0] for result in results]
+
+
+def _resolve(future, slot):
+    if future.done():
+        return
+    if 'error' in slot:
+        future.set_exception(slot['error'])
+    else:
+        future.set_result(slot['label'])
+
+
+class RemoteIntentClassifier:
+    # Client for a shared intent service started with `python intent_service.py`
+    def __init__(self, url, timeout=5.0):
+        self.url = url.rstrip('/') + '/classify'
+        self.timeout = timeout
+
+    def classify(self, message, timeout=None):
+        body = json.dumps({'messages': [message]}).encode('utf-8')
+        req = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=timeout or self.timeout) as resp:
+            return json.loads(resp.read())['labels'][0]
+
+
+class TfidfIntentClassifier:
+    # scikit-learn text classifier predicting the intent labels directly.
+    # A prediction takes well under a millisecond, so calls are not batched.
+    # Messages are normalized like the training queries (intent_training.py).
+    def __init__(self, model, info=None):
+        self.model = model
+        self.info = info or {}
+
+    def classify(self, message, timeout=None):
+        return str(self.model.predict([normalize_message(message)])[0])
+
+    def classify_many(self, messages, timeout=None):
+        return [str(label) for label in self.model.predict([normalize_message(message) for message in messages])]
+
+    def save(self, path):
+        import joblib
+        joblib.dump({'format': TFIDF_MODEL_FORMAT, 'model': self.model, 'info': self.info}, path)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+        stored = joblib.load(path)
+        if stored.get('format') != TFIDF_MODEL_FORMAT:
+            raise ValueError(f"Unsupported intent classifier format in {path}: {stored.get('format')}")
+        return cls(stored['model'], stored.get('info'))
+
+
+def zero_shot_pipeline(model, quantize=False):
+    if quantize:
+        # Checked before the model is downloaded
+        try:
+            import torch
+        except ImportError:
+            raise ImportError("The bart-int8 intent backend needs PyTorch for dynamic quantization: pip install torch") from None
+    from transformers import pipeline
+    classifier = pipeline('zero-shot-classification', model=model)
+    if quantize:
+        # Weights of the Linear layers stored as int8, activations quantized
+        # on the fly; CPU inference only
+        classifier.model = torch.ao.quantization.quantize_dynamic(classifier.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return classifier
+
+
+def load_intent_classifier(backend='bart', model=None, max_batch=16, max_wait=0.01):
+    # `model` overrides the backend's default model name (or, for tfidf, path)
+    if backend not in INTENT_BACKENDS:
+        raise ValueError(f"Unknown intent backend {backend!r}; choose one of {', '.join(INTENT_BACKENDS)}")
+    model = model or INTENT_BACKENDS[backend]
+    if backend == 'tfidf':
+        return TfidfIntentClassifier.load(model)
+    return BatchingClassifier(zero_shot_pipeline(model, quantize=backend == 'bart-int8'), max_batch, max_wait)
+
+
+class IntentEngine:
+    # is_recommendation: keyword check for the recommendation override; the
+    # chat server passes its keyword matcher (see keyword_matcher.py).
+    # labels: optional cache of model labels (see intent_cache.py); the
+    # rules are applied on top of a cached label like on a fresh one.
+    def __init__(self, classifier, fallback='statement', is_recommendation=has_recommendation_keyword, labels=None):
+        self.classifier = classifier
+        self.labels = labels
+        self.fallback = fallback
+        self.is_recommendation = is_recommendation
+        self.model_calls = 0
+        self.short_circuits = 0
+
+    def detect(self, message):
+        return self.detect_result(message)[0]
+
+    def detect_result(self, message):
+        # Returns (intent, reliable); reliable is False when the model failed
+        # and the fallback label was used
+        intent = rule_based_intent(message, self.is_recommendation)
+        if intent is not None:
+            self.short_circuits += 1
+            return intent, True
+        label = self.labels.get(message) if self.labels is not None else None
+        if label:
+            return apply_intent_rules(message, label, self.is_recommendation), True
+        self.model_calls += 1
+        try:
+            label = self.classifier.classify(message)
+            reliable = True
+        except Exception as e:
+            logging.error(f"Intent classification error: {e}")
+            label = self.fallback
+            reliable = False
+        return self._finish(message, label, reliable)
+
+    async def detect_result_async(self, message, run_blocking):
+        # detect_result() for an event loop. A batching classifier is awaited
+        # without holding a thread, so concurrent requests share its batches;
+        # any other classifier runs through run_blocking (e.g. a thread pool).
+        intent = rule_based_intent(message, self.is_recommendation)
+        if intent is not None:
+            self.short_circuits += 1
+            return intent, True
+        label = self.labels.get(message) if self.labels is not None else None
+        if label:
+            return apply_intent_rules(message, label, self.is_recommendation), True
+        self.model_calls += 1
+        try:
+            if isinstance(self.classifier, BatchingClassifier):
+                label = await self.classifier.classify_async(message)
+            else:
+                label = await run_blocking(self.classifier.classify, message)
+            reliable = True
+        except Exception as e:
+            logging.error(f"Intent classification error: {e}")
+            label = self.fallback
+            reliable = False
+        return self._finish(message, label, reliable)
+
+    def _finish(self, message, label, reliable):
+        # Only real model output is cached, never the fallback
+        if reliable and self.labels is not None:
+            self.labels.put(message, label)
+        return apply_intent_rules(message, label, self.is_recommendation), reliable
+
+
+class IntentServer(ThreadingHTTPServer):
+    # Every chat worker keeps requests in flight, so allow a deeper backlog
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_handler(classifier):
+    class IntentHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/classify':
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                messages = json.loads(self.rfile.read(length))['messages']
+                # Messages join the shared batch; requests from all chat
+                # workers are served by this single model instance
+                labels = classifier.classify_many(messages)
+                body = json.dumps({'labels': labels}).encode('utf-8')
+                self.send_response(200)
+            except Exception as e:
+                body = json.dumps({'error': str(e)}).encode('utf-8')
+                self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self.send_error(404)
+                return
+            body = b'{"status": "ok"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return IntentHandler
+
+
+def serve(host='127.0.0.1', port=5001, max_batch=16, max_wait=0.01, model=None, backend='bart'):
+    classifier = load_intent_classifier(backend, model, max_batch=max_batch, max_wait=max_wait)
+    server = IntentServer((host, port), make_handler(classifier))
+    logging.info(f"Intent service ({backend}) listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Shared zero-shot intent service for RecoBuddy workers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--backend', default='bart', choices=list(INTENT_BACKENDS))
+    parser.add_argument('--model', help="model name, or model file for tfidf (default: the backend's)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_batch, args.max_wait_ms / 1000, args.model, args.backend)
@@ -0,0 +1,116 @@
+# Trains the tfidf intent backend (see intent_service.py) from logged
+# behavior events: the JSON lines written by analytics.LogSink
+# (ANALYTICS_SINK=log), or exported global_behavior_daily batch documents
+# ({"queries": [...]} per line). The logged intents are the ones the
+# current model produced, so a held-out share of the queries measures
+# parity with it:
+#   python intent_training.py behavior_logs --output intent_classifier.joblib
+#   INTENT_BACKEND=tfidf python app.py
+import argparse
+import json
+import logging
+import os
+from collections import Counter
+
+from catalog import stable_hash
+from intent_cache import normalize_message
+from intent_service import (CANDIDATE_LABELS, TfidfIntentClassifier, apply_intent_rules, has_recommendation_keyword,
+                            rule_based_intent)
+
+HOLDOUT = 0.2
+
+
+def read_events(paths):
+    # (query, intent) of every logged event under the given files or directories
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(('.jsonl', '.json')))
+        else:
+            files.append(path)
+    for file_path in files:
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                for event in record.get('queries', [record]):
+                    if event.get('query') and event.get('intent') in CANDIDATE_LABELS:
+                        yield event['query'], event['intent']
+
+
+def labeled_queries(events, is_recommendation=has_recommendation_keyword):
+    # One example per normalized query, labeled with its most frequent intent.
+    # Queries the keyword rules decide never reach the model and are left out.
+    labels = {}
+    for query, intent in events:
+        key = normalize_message(query)
+        if key and rule_based_intent(key, is_recommendation) is None:
+            labels.setdefault(key, Counter())[intent] += 1
+    return {query: counts.most_common(1)[0][0] for query, counts in labels.items()}
+
+
+def is_holdout(query, fraction=HOLDOUT):
+    # Stable split by query, so every run holds out the same queries
+    return stable_hash(query) % 1000 < fraction * 1000
+
+
+def split(examples, fraction=HOLDOUT):
+    train, holdout = {}, {}
+    for query, intent in examples.items():
+        (holdout if is_holdout(query, fraction) else train)[query] = intent
+    return train, holdout
+
+
+def train_classifier(examples):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline, make_union
+    features = make_union(
+        TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=1),
+        TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), sublinear_tf=True, min_df=2),
+    )
+    model = make_pipeline(features, LogisticRegression(max_iter=2000, C=4.0))
+    model.fit(list(examples), list(examples.values()))
+    return model
+
+
+def parity(classifier, examples, is_recommendation=has_recommendation_keyword):
+    # Share of queries whose final intent (after the keyword rules, as in
+    # IntentEngine) matches the logged one
+    if not examples:
+        return None
+    predicted = classifier.classify_many(list(examples))
+    final = [apply_intent_rules(query, label, is_recommendation) for query, label in zip(examples, predicted)]
+    return sum(label == examples[query] for query, label in zip(examples, final)) / len(examples)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Train the tfidf intent backend from logged queries')
+    parser.add_argument('logs', nargs='+', help='behavior log files or directories')
+    parser.add_argument('--output', default='intent_classifier.joblib')
+    parser.add_argument('--holdout', type=float, default=HOLDOUT, help='share of queries kept out of training')
+    args = parser.parse_args()
+
+    examples = labeled_queries(read_events(args.logs))
+    train, holdout = split(examples, args.holdout)
+    if len(set(train.values())) < 2:
+        raise SystemExit(f"Need logged queries with at least two intents, found {dict(Counter(train.values()))}")
+    logging.info(f"Training on {len(train)} queries, holding out {len(holdout)}: {dict(Counter(train.values()))}")
+
+    classifier = TfidfIntentClassifier(train_classifier(train), {
+        'trained_queries': len(train),
+        'holdout': args.holdout,
+        'labels': dict(Counter(train.values())),
+    })
+    classifier.info['holdout_parity'] = parity(classifier, holdout)
+    classifier.save(args.output)
+    score = classifier.info['holdout_parity']
+    logging.info(f"Saved {args.output}; held-out parity with the logged intents: "
+                 + (f"{score:.1%} of {len(holdout)} queries" if score is not None else 'no held-out queries'))
+
+
+if __name__ == '__main__':
+    main()
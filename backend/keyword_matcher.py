@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+# Rule layer of /chat: knowledge-base questions, category keywords,
+# recommendation keywords and the profanity list, read from keywords.json
+KEYWORDS_FILE = os.environ.get('KEYWORDS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keywords.json'))
+
+
+class Automaton:
+    # Aho-Corasick automaton over a list of patterns. One pass over the text
+    # finds every occurrence of every pattern, so the cost depends on the
+    # text length and the number of hits, not on the number of patterns.
+    def __init__(self, patterns):
+        self.lengths = [len(pattern) for pattern in patterns]
+        self.goto = [{}]
+        self.outputs = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.outputs.append([])
+                state = nxt
+            self.outputs[state].append(index)
+        self.fail = [0] * len(self.goto)
+        # Breadth-first; children of the root keep fail = 0
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.outputs[nxt] = self.outputs[nxt] + self.outputs[self.fail[nxt]]
+
+    def find(self, text):
+        # Yields (start, end, pattern index) for every occurrence
+        goto, fail, outputs, lengths = self.goto, self.fail, self.outputs, self.lengths
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                yield end - lengths[index], end, index
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class Hits:
+    # Matches of one message, per group, in rule order (a lower priority
+    # number wins, e.g. the first knowledge-base entry or category)
+    def __init__(self, found):
+        self.found = found
+
+    def __contains__(self, group):
+        return group in self.found
+
+    def all(self, group):
+        return [value for _, value in sorted(self.found.get(group, {}).values(), key=lambda match: match[0])]
+
+    def first(self, group, default=None):
+        matches = self.found.get(group)
+        if not matches:
+            return default
+        return min(matches.values(), key=lambda match: match[0])[1]
+
+
+class KeywordMatcher:
+    # One automaton for every rule group. Patterns are matched as substrings
+    # of the (already lower-cased) message, except profanity, which must be
+    # a whole word like the old \b...\b regex.
+    def __init__(self, config):
+        self.config = config
+        self.rules = []
+        for priority, (query, answer) in enumerate(config.get('knowledge_base', {}).items()):
+            self.rules.append(('knowledge_base', query, answer, priority, False))
+        for priority, (category, keywords) in enumerate(config.get('categories', {}).items()):
+            self.rules += [('category', keyword, category, priority, False) for keyword in keywords]
+        self.rules += [('recommendation', keyword, keyword, 0, False) for keyword in config.get('recommendation', [])]
+        self.rules += [('profanity', word, word, 0, True) for word in config.get('profanity', [])]
+        self.automaton = Automaton([rule[1] for rule in self.rules])
+        self.scan = lru_cache(maxsize=4096)(self._scan)
+
+    def _scan(self, message):
+        found = {}
+        for start, end, index in self.automaton.find(message):
+            group, _, value, priority, whole_word = self.rules[index]
+            if whole_word and ((start > 0 and _is_word_char(message[start - 1])) or
+                               (end < len(message) and _is_word_char(message[end]))):
+                continue
+            matches = found.setdefault(group, {})
+            if index not in matches:
+                matches[index] = (priority, value)
+        return Hits(found)
+
+    @property
+    def knowledge_base(self):
+        return self.config.get('knowledge_base', {})
+
+
+def load_keywords(path=KEYWORDS_FILE):
+    with open(path, encoding='utf-8') as f:
+        return KeywordMatcher(json.load(f))
+
+
+class KeywordRules:
+    # The matcher built from the keywords file, rebuilt when the file changes.
+    # The file is checked at most every check_interval seconds; a file that
+    # fails to load is logged and the previous matcher stays in use.
+    # Callbacks passed to on_reload() get the new matcher after each reload.
+    def __init__(self, path=KEYWORDS_FILE, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = os.stat(path).st_mtime_ns
+        self.matcher = load_keywords(path)
+        self.checked = time.monotonic()
+        self.reloads = 0
+        self.listeners = []
+
+    def current(self):
+        if time.monotonic() - self.checked >= self.check_interval:
+            self.reload()
+        return self.matcher
+
+    def on_reload(self, callback):
+        self.listeners.append(callback)
+
+    def reload(self, force=False):
+        if not self._reload(force):
+            return False
+        for callback in self.listeners:
+            try:
+                callback(self.matcher)
+            except Exception as e:
+                logging.error(f"Keyword reload callback failed: {e}")
+        return True
+
+    def _reload(self, force):
+        with self.lock:
+            self.checked = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self.mtime and not force:
+                    return False
+                self.matcher = load_keywords(self.path)
+                self.mtime = mtime
+            except (OSError, ValueError) as e:
+                logging.error(f"Keeping previous keyword rules, {self.path} failed to load: {e}")
+                return False
+            self.reloads += 1
+            logging.info(f"Reloaded keyword rules from {self.path}")
+            return True
+
+    def scan(self, message):
+        return self.current().scan(message)
@@ -0,0 +1,54 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RequestProfiler:
+    # Opt-in cProfile of a sampled fraction of requests. Each profiled
+    # request is dumped to `directory` as a .prof file (open it with pstats
+    # or snakeviz). Only one request is profiled at a time.
+    def __init__(self, rate=0.0, directory='profiles'):
+        self.rate = rate
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.dumped = 0
+
+    def start(self):
+        # A profiler when this request is sampled, else None; pass it to
+        # finish() when the request is done
+        if self.rate <= 0 or random.random() >= self.rate or not self.lock.acquire(blocking=False):
+            return None
+        return cProfile.Profile()
+
+    def finish(self, name, profiler, dump=True):
+        try:
+            if dump:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.dumped}.prof")
+                profiler.dump_stats(path)
+                self.dumped += 1
+                logging.info(f"Request profile written to {path}")
+        finally:
+            self.lock.release()
+
+    @contextmanager
+    def profile(self, name):
+        # Profiles the block on the calling thread when sampled
+        profiler = self.start()
+        if profiler is None:
+            yield
+            return
+        completed = False
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            completed = True
+        finally:
+            self.finish(name, profiler, dump=completed)
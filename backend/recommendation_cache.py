@@ -0,0 +1,59 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationPoolCache:
+    # Short-lived, per-process store of ranked recommendation pools for
+    # /recommendations paging. Each page stores the rest of its pool under a
+    # new random cursor; a cursor stays valid until it expires, so a retried
+    # page request returns the same items. Cursors are tied to the user that
+    # created them. With several workers a cursor only works on the worker
+    # that issued it; elsewhere it looks expired and the client starts over.
+    def __init__(self, ttl=300.0, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, user_id, pool, context=None):
+        # pool: remaining (category, row) pairs, best first; context: the
+        # request parameters the pool was built for
+        cursor = secrets.token_urlsafe(12)
+        with self.lock:
+            self.entries[cursor] = {'user_id': user_id, 'pool': list(pool), 'context': context,
+                                    'expires': time.monotonic() + self.ttl}
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return cursor
+
+    def get(self, cursor, user_id):
+        # (pool, context) for the cursor, or None when it expired or belongs
+        # to another user
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(cursor)
+            if entry is not None and entry['expires'] < now:
+                del self.entries[cursor]
+                entry = None
+            if entry is None or entry['user_id'] != user_id:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry['pool']), entry['context']
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
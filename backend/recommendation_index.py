@@ -0,0 +1,157 @@
+import random
+from bisect import bisect_left
+import numpy as np
+from catalog import StringColumn
+
+# Field used to identify an item in each category (matches generate_recommendation)
+TITLE_KEYS = {'book': 'book_title', 'movie': 'title', 'music': 'name'}
+
+
+def _has_valid_title(title):
+    return bool(title) and str(title).lower() != 'nan'
+
+
+def _invalid_title_rows(column):
+    # Rows whose title is empty or the string 'nan'
+    if isinstance(column, StringColumn):
+        lengths = np.diff(column.offsets)
+        suspects = np.flatnonzero((lengths == 0) | (lengths == 3))
+    else:
+        suspects = range(len(column))
+    return [int(row) for row in suspects if not _has_valid_title(column[row])]
+
+
+class _Bucket:
+    # Catalog rows of one (category, emotion), sorted by ascending rating.
+    # Rows without a usable rating (NaN, or a non-numeric value such as a
+    # Netflix maturity code) are kept after the rated ones.
+    def __init__(self, catalog, key, rows, ratings, rank):
+        self.catalog = catalog
+        self.key = key
+        bucket_ratings = ratings[rows]
+        rated = ~np.isnan(bucket_ratings)
+        order = np.argsort(bucket_ratings[rated], kind='stable')
+        self.ratings = bucket_ratings[rated][order]
+        self.rows = np.concatenate([rows[rated][order], rows[~rated]])
+        self.rank = rank
+        rank[self.rows] = np.arange(len(self.rows))
+        self.invalid_titles = []
+
+    def blocked_positions(self, titles=(), ids=()):
+        # Positions of the excluded items, given by title or by item id
+        # (stable hash of the title, see exclusions.py)
+        if not len(self.rows) or (not titles and not len(ids)):
+            return []
+        rows = np.asarray(self.catalog.lookup(self.key, titles) if titles else [], dtype=np.int64)
+        if len(ids):
+            rows = np.concatenate([rows, self.catalog.lookup_hashes(self.key, ids)])
+        positions = self.rank[rows]
+        # rank is shared by every bucket of the category; keep this bucket's rows
+        inside = positions < len(self.rows)
+        positions, rows = positions[inside], rows[inside]
+        positions = positions[self.rows[positions] == rows]
+        return sorted(set(positions.tolist()))
+
+
+class CandidateSet:
+    # A contiguous rating range of a bucket minus a sorted list of blocked
+    # positions. Supports the same filter steps as the old list comprehension
+    # without materializing the candidates.
+    def __init__(self, bucket, lo, hi, blocked):
+        self.bucket = bucket
+        self.lo = lo
+        self.hi = hi
+        start = bisect_left(blocked, lo)
+        end = bisect_left(blocked, hi)
+        self.blocked = blocked[start:end]
+
+    def __len__(self):
+        return self.hi - self.lo - len(self.blocked)
+
+    def with_min_rating(self, min_rating):
+        if self.bucket is None:
+            return self
+        lo = max(self.lo, int(np.searchsorted(self.bucket.ratings, min_rating, side='left')))
+        hi = min(self.hi, len(self.bucket.ratings))
+        return CandidateSet(self.bucket, lo, max(lo, hi), self.blocked)
+
+    def with_valid_titles(self):
+        if self.bucket is None or not self.bucket.invalid_titles:
+            return self
+        blocked = sorted(set(self.blocked).union(self.bucket.invalid_titles))
+        return CandidateSet(self.bucket, self.lo, self.hi, blocked)
+
+    def sample(self, rng=random):
+        # Uniform pick among allowed positions: draw an index into the allowed
+        # items and step over the blocked positions that come before it
+        pos = self.lo + rng.randrange(len(self))
+        for blocked in self.blocked:
+            if blocked <= pos:
+                pos += 1
+            else:
+                break
+        return self.bucket.catalog[int(self.bucket.rows[pos])]
+
+    def sample_rows(self, k, rng=random):
+        # Catalog rows of k distinct allowed items (all of them if fewer) in
+        # random order, without materializing the candidates
+        k = min(k, len(self))
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        picks = np.array(rng.sample(range(len(self)), k), dtype=np.int64)
+        if self.blocked:
+            # The i-th allowed position skips every blocked position up to it
+            blocked = np.asarray(self.blocked, dtype=np.int64) - self.lo
+            picks += np.searchsorted(blocked - np.arange(len(blocked)), picks, side='right')
+        return np.asarray(self.bucket.rows)[self.lo + picks]
+
+    def rows(self):
+        # Catalog rows of the allowed items
+        if self.bucket is None:
+            return np.array([], dtype=np.int64)
+        positions = np.arange(self.lo, self.hi)
+        if self.blocked:
+            positions = np.delete(positions, np.asarray(self.blocked) - self.lo)
+        return np.asarray(self.bucket.rows)[positions]
+
+    def __iter__(self):
+        blocked = set(self.blocked)
+        for pos in range(self.lo, self.hi):
+            if pos not in blocked:
+                yield self.bucket.catalog[int(self.bucket.rows[pos])]
+
+
+class RecommendationIndex:
+    def __init__(self, catalogs):
+        # catalogs: {'book': book_data, 'movie': movie_data, 'music': music_data}
+        self.buckets = {}
+        self.catalogs = catalogs
+        for category, catalog in catalogs.items():
+            if not len(catalog):
+                continue
+            key = TITLE_KEYS[category]
+            titles = catalog.column(key)
+            if hasattr(titles, 'prepare_lookup'):
+                titles.prepare_lookup()
+            ratings = catalog.numeric('rating')
+            rank = np.zeros(len(catalog), dtype=np.int64)
+            emotions = catalog.column('emotion')
+            invalid = np.asarray(_invalid_title_rows(titles), dtype=np.int64)
+            for code, emotion in enumerate(emotions.categories):
+                rows = np.flatnonzero(emotions.codes == code)
+                bucket = _Bucket(catalog, key, rows, ratings, rank)
+                self.buckets[(category, emotion)] = bucket
+            for row in invalid:
+                if emotions.codes[row] < 0:
+                    continue
+                bucket = self.buckets[(category, emotions[row])]
+                bucket.invalid_titles.append(int(rank[row]))
+            for bucket in self.buckets.values():
+                bucket.invalid_titles.sort()
+
+    def candidates(self, category, emotion, excluded=(), excluded_ids=()):
+        bucket = self.buckets.get((category, emotion))
+        if bucket is None:
+            return CandidateSet(None, 0, 0, [])
+        blocked = bucket.blocked_positions(excluded, excluded_ids)
+        return CandidateSet(bucket, 0, len(bucket.rows), blocked)
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class Resource:
+    # A lazily created, shared object. The first get() runs the loader (other
+    # callers wait for it); later calls return the same value. A failed load
+    # is retried on the next get(). start() loads it in the background
+    # instead, for optional resources a request shouldn't wait for.
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.state = PENDING
+        self.error = None
+        self.seconds = None
+        self.lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def get(self):
+        if self.state == READY:
+            return self.value
+        with self.lock:
+            if self.state == READY:
+                return self.value
+            self.state = LOADING
+            started = time.perf_counter()
+            try:
+                value = self.loader()
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                self.seconds = time.perf_counter() - started
+                logging.error(f"Loading {self.name} failed after {self.seconds:.2f}s: {e}")
+                raise
+            self.seconds = time.perf_counter() - started
+            self.value = value
+            self.error = None
+            self.state = READY
+            return value
+
+    def start(self):
+        # Starts loading on a background thread unless loaded or already loading
+        # (self.lock is held for the whole load, so it can't guard this)
+        if self.state in (READY, LOADING) or (self.thread is not None and self.thread.is_alive()):
+            return
+        with self.start_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.load_quietly, name=f"load-{self.name}", daemon=True)
+                self.thread.start()
+
+    def load_quietly(self):
+        # get() for background threads; a failure is already logged
+        try:
+            self.get()
+        except Exception:
+            pass
+
+    def status(self):
+        status = {'state': self.state}
+        if self.seconds is not None:
+            status['seconds'] = round(self.seconds, 3)
+        if self.error:
+            status['error'] = self.error
+        return status
+
+
+class Startup:
+    # The server's resources, in the order they are warmed up. Nothing is
+    # loaded at import time: warm_up() loads every resource in the
+    # background, and a request that needs one before then loads it itself.
+    def __init__(self):
+        self.resources = OrderedDict()
+        self.started = None
+        self.finished = None
+
+    def add(self, name, loader):
+        resource = Resource(name, loader)
+        self.resources[name] = resource
+        return resource
+
+    def warm_up(self):
+        # Every resource loads on its own thread; dependencies are resolved by
+        # the loaders calling get() on each other. Returns the reporter thread.
+        if self.started is not None:
+            return None
+        self.started = time.perf_counter()
+        threads = [threading.Thread(target=resource.load_quietly, name=f"warm-up-{name}", daemon=True)
+                   for name, resource in self.resources.items()]
+        for thread in threads:
+            thread.start()
+        reporter = threading.Thread(target=self._report, args=(threads,), name='warm-up-report', daemon=True)
+        reporter.start()
+        return reporter
+
+    def _report(self, threads):
+        for thread in threads:
+            thread.join()
+        self.finished = time.perf_counter()
+        stages = ', '.join(f"{name} {resource.state}" + (f" {resource.seconds:.2f}s" if resource.seconds is not None else '')
+                           for name, resource in self.resources.items())
+        logging.info(f"Startup finished in {self.finished - self.started:.2f}s: {stages}")
+
+    def wait(self):
+        # Load everything on the calling thread, in order
+        for resource in self.resources.values():
+            resource.get()
+
+    @property
+    def ready(self):
+        return all(resource.ready for resource in self.resources.values())
+
+    @property
+    def failed(self):
+        return [name for name, resource in self.resources.items() if resource.state == FAILED]
+
+    def status(self):
+        if self.ready:
+            state = READY
+        elif self.failed and self.finished is not None:
+            state = FAILED
+        else:
+            state = 'starting'
+        status = {'status': state, 'stages': {name: resource.status() for name, resource in self.resources.items()}}
+        if self.finished is not None:
+            status['seconds'] = round(self.finished - self.started, 3)
+        return status
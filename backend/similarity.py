@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+from recommendation_index import TITLE_KEYS
+
+# Bump when the features or the on-disk layout change
+FEATURE_FORMAT = 1
+
+# Per-category item features: z-scored numeric columns, TF-IDF of the text
+# columns and a one-hot of the emotion label, each scaled by its weight
+NUMERIC_FEATURES = {
+    'music': {'danceability': 1.0, 'energy': 1.0, 'year': 0.5},
+    'movie': {'release_year': 0.3},
+    'book': {'rating': 0.5, 'year_of_publication': 0.3},
+}
+TEXT_FEATURES = {
+    'movie': {'listed_in': 1.0, 'description': 1.0},
+    'book': {'book_title': 1.0, 'Category': 1.0},
+}
+EMOTION_WEIGHT = 1.0
+MAX_TEXT_FEATURES = 20000
+MAX_LIKED = 50
+
+
+def _numeric_block(catalog, weights):
+    columns = []
+    for name, weight in weights.items():
+        values = catalog.numeric(name).astype(np.float32)
+        missing = np.isnan(values)
+        if missing.all():
+            values = np.zeros_like(values)
+        else:
+            values[missing] = np.nanmean(values)
+            std = values.std()
+            values = (values - values.mean()) / (std if std > 0 else 1.0)
+        columns.append(values * weight)
+    return np.column_stack(columns)
+
+
+def _text_block(catalog, name, weight):
+    column = catalog.column(name)
+    texts = ['' if not isinstance(value, str) else value for value in (column[i] for i in range(len(catalog)))]
+    vectorizer = TfidfVectorizer(max_features=MAX_TEXT_FEATURES, stop_words='english',
+                                 sublinear_tf=True, dtype=np.float32)
+    try:
+        return vectorizer.fit_transform(texts) * weight
+    except ValueError:
+        # Empty vocabulary (e.g. every value missing)
+        return sparse.csr_matrix((len(catalog), 0), dtype=np.float32)
+
+
+def _emotion_block(catalog):
+    emotions = catalog.column('emotion')
+    codes = np.asarray(emotions.codes)
+    rows = np.flatnonzero(codes >= 0)
+    return sparse.csr_matrix(
+        (np.full(len(rows), EMOTION_WEIGHT, dtype=np.float32), (rows, codes[rows])),
+        shape=(len(catalog), len(emotions.categories))
+    )
+
+
+def build_features(category, catalog):
+    # Row-normalized item matrix of one category: dense when it only has
+    # numeric features, CSR when it includes TF-IDF text
+    blocks = [_numeric_block(catalog, NUMERIC_FEATURES[category])]
+    blocks += [_text_block(catalog, name, weight) for name, weight in TEXT_FEATURES.get(category, {}).items()]
+    blocks.append(_emotion_block(catalog))
+    if len(blocks) == 2:
+        matrix = np.hstack([blocks[0], blocks[1].toarray()])
+    else:
+        matrix = sparse.hstack([sparse.csr_matrix(blocks[0])] + blocks[1:], format='csr', dtype=np.float32)
+    return normalize(matrix, copy=False).astype(np.float32, copy=False)
+
+
+def save_features(matrix, directory):
+    os.makedirs(directory, exist_ok=True)
+    if sparse.issparse(matrix):
+        arrays = {'data': matrix.data, 'indices': matrix.indices, 'indptr': matrix.indptr}
+    else:
+        arrays = {'matrix': matrix}
+    for part, array in arrays.items():
+        np.save(os.path.join(directory, f"{part}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'format': FEATURE_FORMAT, 'sparse': sparse.issparse(matrix), 'shape': list(matrix.shape)}, f)
+
+
+def load_features(directory, mmap_mode='r'):
+    # Memory-mapped like the catalog snapshots, so workers share the pages
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != FEATURE_FORMAT:
+        raise ValueError(f"Unsupported feature format: {meta.get('format')}")
+    load = lambda part: np.load(os.path.join(directory, f"{part}.npy"), mmap_mode=mmap_mode)
+    if not meta['sparse']:
+        return load('matrix')
+    return sparse.csr_matrix((load('data'), load('indices'), load('indptr')), shape=tuple(meta['shape']), copy=False)
+
+
+def cached_features(category, catalog):
+    # Features of a snapshot-backed catalog are stored in the snapshot
+    # (features/) the first time and memory-mapped afterwards; a rebuilt
+    # snapshot gets a new directory, so they never go stale
+    if getattr(catalog, 'path', None) is None:
+        return build_features(category, catalog)
+    directory = os.path.join(catalog.path, 'features')
+    if os.path.isdir(directory):
+        try:
+            return load_features(directory)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Rebuilding {category} features: {e}")
+            shutil.rmtree(directory, ignore_errors=True)
+    matrix = build_features(category, catalog)
+    staging = tempfile.mkdtemp(prefix='.features-', dir=catalog.path)
+    try:
+        save_features(matrix, staging)
+        os.rename(staging, directory)
+    except OSError:
+        # Another worker published them first
+        shutil.rmtree(staging, ignore_errors=True)
+    logging.info(f"Built {category} feature matrix {matrix.shape}")
+    return load_features(directory) if os.path.isdir(directory) else matrix
+
+
+class SimilarityEngine:
+    # Ranks catalog items by cosine similarity to a query built from the
+    # user's liked items and the wanted emotion. Scoring a category is one
+    # matrix-vector product over its precomputed, row-normalized features.
+    def __init__(self, catalogs, features=None):
+        self.catalogs = catalogs
+        self.features = dict(features or {})
+        for category, catalog in catalogs.items():
+            if category not in self.features and len(catalog):
+                self.features[category] = cached_features(category, catalog)
+
+    def liked_rows(self, category, liked):
+        titles = list(dict.fromkeys(liked))[-MAX_LIKED:]
+        if not titles or category not in self.features:
+            return []
+        return self.catalogs[category].lookup(TITLE_KEYS[category], titles)
+
+    def query(self, category, liked_rows=(), emotion=None):
+        matrix = self.features[category]
+        query = np.zeros(matrix.shape[1], dtype=np.float32)
+        if len(liked_rows):
+            profile = matrix[np.asarray(liked_rows)].mean(axis=0)
+            query += np.asarray(profile, dtype=np.float32).ravel()
+        emotions = self.catalogs[category].column('emotion')
+        code = emotions.code_of(emotion) if emotion is not None else -1
+        if code >= 0:
+            # The emotion one-hot occupies the last columns
+            query[matrix.shape[1] - len(emotions.categories) + code] += EMOTION_WEIGHT
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    def top_k(self, category, query, k=10, rows=None, blocked=()):
+        # Best k rows by score, best first. `rows` restricts the search to
+        # those catalog rows; `blocked` rows are never returned.
+        scores = self.features[category] @ query
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            scores = scores[rows]
+        if len(blocked):
+            blocked = np.asarray(blocked, dtype=np.int64)
+            if rows is not None:
+                blocked = np.flatnonzero(np.isin(rows, blocked))
+            scores = scores.copy()
+            scores[blocked] = -np.inf
+        k = min(k, int(np.count_nonzero(scores > -np.inf)))
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return rows[top] if rows is not None else top
+
+    def recommend(self, category, liked=(), emotion=None, excluded=(), k=10):
+        catalog = self.catalogs.get(category)
+        if catalog is None or category not in self.features:
+            return np.array([], dtype=np.int64)
+        blocked = catalog.lookup(TITLE_KEYS[category], excluded) if excluded else ()
+        query = self.query(category, self.liked_rows(category, liked), emotion)
+        return self.top_k(category, query, k, blocked=blocked)
+
+    def nbytes(self):
+        total = 0
+        for matrix in self.features.values():
+            total += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes if sparse.issparse(matrix) else matrix.nbytes
+        return total
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Languages offered by the frontend besides English
+SUPPORTED_LANGUAGES = ['es', 'fr', 'hi']
+
+
+class TranslationService:
+    # Wraps a googletrans-style translator (translate(text, src=, dest=).text)
+    # with the translation store, a bounded pool of translation calls,
+    # a timeout that falls back to the original text, and coalescing of
+    # identical requests that are already in flight. Pre-translation runs on
+    # its own smaller pool, so live requests never queue behind it.
+    def __init__(self, translator, store, max_concurrency=8, timeout=3.0, pretranslate_concurrency=2):
+        self.translator = translator
+        self.store = store
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='translate')
+        self.background = ThreadPoolExecutor(max_workers=pretranslate_concurrency, thread_name_prefix='pretranslate')
+        self.background_slots = threading.Semaphore(pretranslate_concurrency)
+        self.closed = False
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _fetch(self, text, src, dest):
+        translated = self.translator.translate(text, src=src, dest=dest).text
+        self.store.put(text, src, dest, translated)
+        logging.info(f"Translated '{text}' from {src} to {dest}: '{translated}'")
+        return translated
+
+    def _done(self, key, future):
+        with self.lock:
+            self.inflight.pop(key, None)
+        if future.exception() is not None:
+            logging.error(f"Translation error: {future.exception()}")
+
+    def submit(self, text, src='en', dest='en', executor=None):
+        # Future for the translation, shared with any identical request in flight
+        key = (text, src, dest)
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = (executor or self.executor).submit(self._fetch, text, src, dest)
+            self.inflight[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def lookup(self, text, src='en', dest='en'):
+        if src == dest or not text:
+            return text
+        return self.store.get(text, src, dest)
+
+    def translate(self, text, src='en', dest='en'):
+        cached = self.lookup(text, src, dest)
+        if cached is not None:
+            return cached
+        try:
+            return self.submit(text, src, dest).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.timeouts += 1
+            logging.warning(f"Translation to {dest} timed out, using original text")
+            return text
+        except Exception:
+            return text
+
+    def translate_many(self, texts, src='en', dest='en'):
+        # Like translate() for each text, with the missing ones fetched
+        # concurrently under one shared timeout
+        results = [self.lookup(text, src, dest) for text in texts]
+        pending = {i: self.submit(text, src, dest) for i, text in enumerate(texts) if results[i] is None}
+        deadline = time.monotonic() + self.timeout
+        for i, future in pending.items():
+            try:
+                results[i] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                self.timeouts += 1
+                logging.warning(f"Translation to {dest} timed out, using original text")
+                results[i] = texts[i]
+            except Exception:
+                results[i] = texts[i]
+        return results
+
+    async def translate_async(self, text, src='en', dest='en'):
+        cached = self.lookup(text, src, dest)
+        if cached is not None:
+            return cached
+        future = asyncio.wrap_future(self.submit(text, src, dest))
+        try:
+            # shield: a timeout here must not cancel the coalesced request
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logging.warning(f"Translation to {dest} timed out, using original text")
+            return text
+        except Exception:
+            return text
+
+    def pretranslate(self, texts, languages=SUPPORTED_LANGUAGES, src='en'):
+        # Translates every missing (text, language) pair in the background and
+        # returns at once. A feeder thread hands the pairs to the
+        # pre-translation pool only as its workers free up; returns that thread.
+        feeder = threading.Thread(target=self._feed, args=(list(dict.fromkeys(texts)), languages, src),
+                                  name='pretranslate-feed', daemon=True)
+        feeder.start()
+        return feeder
+
+    def _feed(self, texts, languages, src):
+        pairs = [(text, dest) for dest in languages for text in texts if self.lookup(text, src, dest) is None]
+        if pairs:
+            logging.info(f"Pre-translating {len(pairs)} static replies")
+        for text, dest in pairs:
+            self.background_slots.acquire()
+            # A live request may have translated it meanwhile
+            if self.lookup(text, src, dest) is not None:
+                self.background_slots.release()
+                continue
+            if self.closed:
+                self.background_slots.release()
+                return
+            try:
+                future = self.submit(text, src, dest, self.background)
+            except RuntimeError:
+                # The interpreter is shutting down and the pool refuses new work
+                self.background_slots.release()
+                return
+            future.add_done_callback(lambda _: self.background_slots.release())
+
+    def close(self):
+        # Stops pre-translation: the feeder hands out no more pairs and the
+        # queued ones are dropped (they are fetched again on the next start)
+        self.closed = True
+        self.background.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,158 @@
+import argparse
+import atexit
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    source TEXT NOT NULL,
+    src TEXT NOT NULL,
+    dest TEXT NOT NULL,
+    translated TEXT NOT NULL,
+    PRIMARY KEY (source, src, dest)
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY
+);
+"""
+
+
+class TranslationStore:
+    # Translation cache shared by all workers through one SQLite database in
+    # WAL mode. Each process keeps a small LRU in front of it; new entries are
+    # buffered and written in one transaction when flush_size entries are
+    # pending or every flush_interval seconds.
+    def __init__(self, path='translation_cache.db', lru_size=5000, flush_size=50, flush_interval=2.0):
+        self.path = path
+        self.lru_size = lru_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.lru = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.closed = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+        self.flusher = threading.Thread(target=self._flush_periodically, name='translation-flush', daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def _remember(self, key, translated):
+        self.lru[key] = translated
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def get(self, text, src, dest):
+        key = (text, src, dest)
+        with self.lock:
+            if key in self.lru:
+                self.lru.move_to_end(key)
+                self.hits += 1
+                return self.lru[key]
+            if key in self.pending:
+                self.hits += 1
+                return self.pending[key]
+        # Another worker may have stored it since
+        row = self._connection().execute(
+            'SELECT translated FROM translations WHERE source = ? AND src = ? AND dest = ?', key
+        ).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, row[0])
+        return row[0]
+
+    def put(self, text, src, dest, translated):
+        key = (text, src, dest)
+        with self.lock:
+            self._remember(key, translated)
+            self.pending[key] = translated
+            should_flush = len(self.pending) >= self.flush_size
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+        rows = [(source, src, dest, translated) for (source, src, dest), translated in batch.items()]
+        try:
+            with self._connection() as conn:
+                conn.executemany('INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logging.error(f"Translation cache flush failed: {e}")
+            with self.lock:
+                for key, translated in batch.items():
+                    self.pending.setdefault(key, translated)
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.closed.set()
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'memory_entries': len(self.lru),
+                'pending': len(self.pending),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
+    def migrate_pickle(self, pickle_path):
+        # One-time import of the old translation_cache.pkl ({"text:src:dest": translated})
+        name = f"pickle:{os.path.abspath(pickle_path)}"
+        conn = self._connection()
+        if conn.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone():
+            return 0
+        with open(pickle_path, 'rb') as f:
+            old_cache = pickle.load(f)
+        rows = []
+        for cache_key, translated in old_cache.items():
+            source, src, dest = cache_key.rsplit(':', 2)
+            rows.append((source, src, dest, translated))
+        with conn:
+            # Keep entries already written by the new store
+            conn.executemany('INSERT OR IGNORE INTO translations VALUES (?, ?, ?, ?)', rows)
+            conn.execute('INSERT OR IGNORE INTO migrations VALUES (?)', (name,))
+        logging.info(f"Imported {len(rows)} translations from {pickle_path}")
+        return len(rows)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Import translation_cache.pkl into the SQLite translation store')
+    parser.add_argument('--pickle', default='translation_cache.pkl')
+    parser.add_argument('--db', default='translation_cache.db')
+    args = parser.parse_args()
+    store = TranslationStore(args.db)
+    store.migrate_pickle(args.pickle)
+    print(f"{len(store)} translations in {args.db}")
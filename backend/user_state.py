@@ -0,0 +1,280 @@
+import atexit
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from exclusions import empty_exclusions
+from metrics import STAGE_SECONDS
+
+MAX_BATCH_WRITES = 500
+# Commits a rejected write is retried for before it is dropped, waiting
+# RETRY_DELAY seconds after the first failure and twice as long after each next
+MAX_WRITE_ATTEMPTS = 5
+RETRY_DELAY = 1.0
+
+
+def default_user_data(email='anonymous'):
+    return {
+        'email': email,
+        'chat_history': [],
+        'preferences': {'liked': [], 'categories': []},
+        'exclusions': empty_exclusions()
+    }
+
+
+def diff_user_data(old, new, array_union, prefix=''):
+    # Field-path updates that turn `old` into `new`. Nested dicts become dotted
+    # paths; a list that only gained new, distinct items becomes an array union
+    # of those items; anything else is written whole.
+    updates = {}
+    for field, value in new.items():
+        path = f"{prefix}{field}"
+        if field not in old:
+            updates[path] = value
+            continue
+        previous = old[field]
+        if previous == value:
+            continue
+        if isinstance(value, dict) and isinstance(previous, dict) and set(previous) <= set(value):
+            updates.update(diff_user_data(previous, value, array_union, f"{path}."))
+        elif (isinstance(value, list) and isinstance(previous, list) and previous
+              and value[:len(previous)] == previous
+              and all(item not in previous for item in value[len(previous):])
+              and all(value.count(item) == 1 for item in value[len(previous):])):
+            updates[path] = array_union(value[len(previous):])
+        else:
+            updates[path] = value
+    return updates
+
+
+class UserStateStore:
+    # Session cache and write coalescer for users/{id} documents.
+    # Reads are served from a per-process cache for `ttl` seconds. save() only
+    # updates the cache and marks the user dirty; a background thread commits
+    # all dirty users in one batch `flush_delay` seconds later, writing only
+    # the fields that changed since the last commit. At most `max_size` users
+    # are kept: expired entries are swept on every flush, and the least
+    # recently used clean ones are evicted past the cap (users with unflushed
+    # changes are never evicted). A write the database keeps rejecting is
+    # retried with backoff and dropped after MAX_WRITE_ATTEMPTS commits; the
+    # user is then re-read.
+    # migrate(doc) may upgrade a stored document in place and return True;
+    # the upgraded document is then written whole on the next commit.
+    def __init__(self, db, auth_client, array_union, ttl=30.0, flush_delay=0.25, collection='users', migrate=None,
+                 max_size=10000):
+        self.db = db
+        self.auth_client = auth_client
+        self.array_union = array_union
+        self.migrate = migrate
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.collection = collection
+        self.max_size = max_size
+        self.docs = OrderedDict()
+        self.emails = OrderedDict()
+        self.dirty = set()
+        self.committing = set()
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.closed = False
+        self.commits = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dropped = 0
+        self.flusher = threading.Thread(target=self._flush_loop, name='user-state-flush', daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def get_email(self, user_id):
+        if user_id == 'anonymous':
+            return 'anonymous'
+        now = time.monotonic()
+        with self.lock:
+            cached = self.emails.get(user_id)
+            if cached and cached[1] > now:
+                return cached[0]
+        try:
+            with STAGE_SECONDS.time('auth_lookup'):
+                email = self.auth_client.get_user(user_id).email
+        except Exception as e:
+            logging.error(f"Error fetching user email: {e}")
+            return 'anonymous'
+        with self.lock:
+            self.emails[user_id] = (email, now + self.ttl)
+            self.emails.move_to_end(user_id)
+            while len(self.emails) > self.max_size:
+                self.emails.popitem(last=False)
+        return email
+
+    def load(self, user_id):
+        # Returns a private copy of the user document; pass it back to save().
+        # The auth lookup for the email only happens for a new user.
+        now = time.monotonic()
+        with self.lock:
+            entry = self.docs.get(user_id)
+            # Unflushed changes are never dropped in favour of a re-read
+            if entry and (entry['expires'] > now or user_id in self.dirty):
+                self.hits += 1
+                self.docs.move_to_end(user_id)
+                return copy.deepcopy(entry['current'])
+            self.misses += 1
+        with STAGE_SECONDS.time('user_read'):
+            stored = self.db.collection(self.collection).document(user_id).get().to_dict()
+        current = copy.deepcopy(stored) if stored else default_user_data(self.get_email(user_id))
+        if stored and self.migrate and self.migrate(current):
+            stored = None
+        with self.lock:
+            entry = self.docs.get(user_id)
+            if entry and user_id in self.dirty:
+                return copy.deepcopy(entry['current'])
+            self.docs[user_id] = {'base': stored, 'current': copy.deepcopy(current), 'expires': now + self.ttl}
+            self.docs.move_to_end(user_id)
+            self._evict_locked()
+        return current
+
+    def save(self, user_id, user_data):
+        with self.lock:
+            entry = self.docs.setdefault(user_id, {'base': None, 'current': None, 'expires': 0})
+            entry['current'] = copy.deepcopy(user_data)
+            entry['expires'] = time.monotonic() + self.ttl
+            self.docs.move_to_end(user_id)
+            self.dirty.add(user_id)
+            self.wakeup.notify()
+
+    def _flush_loop(self):
+        with self.lock:
+            while not self.closed:
+                if not self.dirty:
+                    self.wakeup.wait()
+                    continue
+                # Let rapid successive saves pile up into one commit
+                self.wakeup.wait(self.flush_delay)
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked(retry_now=True)
+
+    def _evictable(self, user_id):
+        return user_id not in self.dirty and user_id not in self.committing
+
+    def _evict_locked(self, sweep=False):
+        # Drops clean entries: all expired ones when sweeping, then the least
+        # recently used ones while over the size cap
+        if sweep:
+            now = time.monotonic()
+            for user_id in [user_id for user_id, entry in self.docs.items()
+                            if entry['expires'] <= now and self._evictable(user_id)]:
+                del self.docs[user_id]
+                self.evictions += 1
+            for user_id in [user_id for user_id, (_, expires) in self.emails.items() if expires <= now]:
+                del self.emails[user_id]
+        if len(self.docs) > self.max_size:
+            excess = len(self.docs) - self.max_size
+            for user_id in [user_id for user_id in self.docs if self._evictable(user_id)][:excess]:
+                del self.docs[user_id]
+                self.evictions += 1
+
+    def _commit(self, writes):
+        batch = self.db.batch()
+        for user_id, kind, payload, _ in writes:
+            ref = self.db.collection(self.collection).document(user_id)
+            if kind == 'set':
+                batch.set(ref, payload)
+            else:
+                batch.update(ref, payload)
+        with STAGE_SECONDS.time('firestore_write'):
+            batch.commit()
+
+    def _commit_writes(self, writes):
+        # The writes that failed. A failed batch is retried one write at a
+        # time, so one rejected document doesn't hold back the others.
+        try:
+            self._commit(writes)
+            return []
+        except Exception as e:
+            logging.error(f"User state commit failed: {e}")
+        if len(writes) == 1:
+            return writes
+        failed = []
+        for write in writes:
+            try:
+                self._commit([write])
+            except Exception as e:
+                logging.error(f"User state write for {write[0]} failed: {e}")
+                failed.append(write)
+        return failed
+
+    def _flush_locked(self, retry_now=False):
+        self._evict_locked(sweep=True)
+        if not self.dirty:
+            return
+        # Firestore accepts at most 500 writes per batch; the rest, and users
+        # waiting to retry a failed write, stay dirty
+        now = time.monotonic()
+        users = [user_id for user_id in self.dirty
+                 if retry_now or user_id not in self.failures or self.failures[user_id][1] <= now][:MAX_BATCH_WRITES]
+        self.dirty.difference_update(users)
+        writes = []
+        for user_id in users:
+            entry = self.docs[user_id]
+            current = copy.deepcopy(entry['current'])
+            if entry['base'] is None:
+                writes.append((user_id, 'set', current, current))
+            else:
+                updates = diff_user_data(entry['base'], current, self.array_union)
+                if updates:
+                    writes.append((user_id, 'update', updates, current))
+        if not writes:
+            return
+        # Commit outside the lock so requests aren't blocked on Firestore
+        self.committing.update(user_id for user_id, _, _, _ in writes)
+        self.lock.release()
+        try:
+            failed = self._commit_writes(writes)
+        finally:
+            self.lock.acquire()
+            self.committing.clear()
+        failed_ids = {user_id for user_id, _, _, _ in failed}
+        if len(failed) < len(writes):
+            self.commits += 1
+        for user_id, _, _, current in writes:
+            if user_id not in failed_ids:
+                self.failures.pop(user_id, None)
+                self.docs[user_id]['base'] = current
+                continue
+            attempts = self.failures.get(user_id, (0, 0))[0] + 1
+            if attempts < MAX_WRITE_ATTEMPTS:
+                self.failures[user_id] = (attempts, time.monotonic() + RETRY_DELAY * 2 ** (attempts - 1))
+                self.dirty.add(user_id)
+                continue
+            # Rejected every time: give up on the unsaved changes, so the
+            # next load() reads what is actually stored
+            logging.error(f"Dropping user state changes for {user_id} after {attempts} failed commits")
+            self.failures.pop(user_id, None)
+            self.dirty.discard(user_id)
+            self.docs.pop(user_id, None)
+            self.dropped += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'cached': len(self.docs),
+                'dirty': len(self.dirty),
+                'hits': self.hits,
+                'misses': self.misses,
+                'commits': self.commits,
+                'evictions': self.evictions,
+                'dropped_writes': self.dropped,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.wakeup.notify()
+            self._flush_locked(retry_now=True)